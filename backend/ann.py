@@ -0,0 +1,143 @@
+# backend/ann.py
+import argparse
+import time
+
+import numpy as np
+
+from keyword_store import load_keywords
+from retrieval import KeywordIndex, normalize_rows, select_top_k
+
+ANN_FILE = "keyword_ivf.npz"
+
+
+def _assign(vectors, centroids, chunk_size=65536):
+    """Return the nearest centroid (by inner product) for every row, in chunks."""
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_size):
+        chunk = vectors[start:start + chunk_size]
+        labels[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means partitions over normalized vectors.
+
+    A query scores every centroid, then scans only the `nprobe` closest lists.
+    `store_version` is the keyword store whose row order the lists refer to.
+    """
+
+    def __init__(self, centroids, list_offsets, list_ids, store_version=""):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.store_version = store_version
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @property
+    def n_rows(self):
+        return len(self.list_ids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, n_iter=10, sample_size=200_000, seed=0, store_version=""):
+        """Train centroids on (a sample of) `vectors`, which must be L2-normalized."""
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        if n_lists is None:
+            n_lists = max(1, int(4 * np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        sample = vectors
+        if n > sample_size:
+            sample = vectors[rng.choice(n, sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            # Re-seed empty lists with random points so no partition is wasted
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        labels = _assign(vectors, centroids)
+        list_ids = np.argsort(labels, kind="stable").astype(np.int64)
+        counts = np.bincount(labels, minlength=n_lists)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(centroids.astype(np.float32), list_offsets, list_ids, store_version)
+
+    def save(self, path=ANN_FILE):
+        np.savez(path, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids,
+                 store_version=self.store_version)
+
+    @classmethod
+    def load(cls, path=ANN_FILE):
+        data = np.load(path)
+        # Files written before the store version was recorded cannot be checked against it
+        store_version = str(data["store_version"]) if "store_version" in data.files else ""
+        return cls(data["centroids"], data["list_offsets"], data["list_ids"], store_version)
+
+    def search(self, vectors, queries, k, nprobe=8):
+        """Approximate top-k over `vectors` for normalized `queries`.
+
+        Returns (indices, scores) shaped (n_queries, k); slots with no
+        candidate hold index -1 and score -inf.
+        """
+        nprobe = min(nprobe, self.n_lists)
+        probe_lists, _ = select_top_k(queries @ self.centroids.T, nprobe)
+
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for row, (query, lists) in enumerate(zip(queries, probe_lists)):
+            candidate_ids = np.concatenate(
+                [self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in lists]
+            )
+            if candidate_ids.size == 0:
+                continue
+            candidate_scores = vectors[candidate_ids] @ query
+            top, top_scores = select_top_k(candidate_scores[None, :], k)
+            indices[row, :top.shape[1]] = candidate_ids[top[0]]
+            scores[row, :top.shape[1]] = top_scores[0]
+        return indices, scores
+
+
+def recall_report(keywords, vectors, n_queries=200, k=5, nprobes=(1, 2, 4, 8, 16, 32, 64), noise=0.05, seed=0):
+    """Print recall@k and per-query latency of the IVF index against exact search."""
+    rng = np.random.default_rng(seed)
+    exact = KeywordIndex(keywords, vectors)
+    queries = exact.vectors[rng.choice(len(exact), min(n_queries, len(exact)), replace=False)]
+    queries = normalize_rows(queries + rng.normal(scale=noise, size=queries.shape).astype(np.float32))
+
+    start = time.perf_counter()
+    ivf = IVFIndex.build(exact.vectors)
+    print(f"IVF build: {ivf.n_lists} lists over {ivf.n_rows} keywords in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    truth, _ = exact.top_k(queries, k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"{'mode':>12} {'recall@' + str(k):>10} {'ms/query':>10}")
+    print(f"{'exact':>12} {1.0:>10.3f} {exact_ms:>10.3f}")
+
+    for nprobe in nprobes:
+        if nprobe > ivf.n_lists:
+            break
+        start = time.perf_counter()
+        approx, _ = ivf.search(exact.vectors, queries, k, nprobe)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        hits = sum(len(set(a) & set(t)) for a, t in zip(approx, truth))
+        print(f"{'nprobe=' + str(nprobe):>12} {hits / truth.size:>10.3f} {ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall-vs-latency report for the IVF keyword index")
+    parser.add_argument("cache_file", nargs="?", default="keyword_cache.kwc")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    keywords, vectors = load_keywords(args.cache_file)
+    recall_report(keywords, vectors, n_queries=args.queries, k=args.k)
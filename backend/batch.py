@@ -0,0 +1,38 @@
+# backend/batch.py
+"""Run many mood phrases through the recommendation pipeline from the command line.
+
+Reads one user_input per line and writes one JSON result per line, e.g.
+
+    python batch.py moods.txt -o results.jsonl
+    cat moods.txt | python batch.py > results.jsonl
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+import main
+
+
+async def run(snapshot, user_inputs, out, concurrency):
+    async for result in main.recommend_batch(user_inputs, concurrency=concurrency, snapshot=snapshot):
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+    await main.client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch movie keyword recommendations (JSON lines output)")
+    parser.add_argument("input", nargs="?", type=argparse.FileType("r"), default=sys.stdin)
+    parser.add_argument("-o", "--output", type=argparse.FileType("w"), default=sys.stdout)
+    parser.add_argument("--concurrency", type=int, default=main.BATCH_CONCURRENCY)
+    args = parser.parse_args()
+
+    # Importing main no longer loads anything; the server does this in the background
+    try:
+        snapshot = main.load_snapshot()
+    except Exception as e:
+        sys.exit(f"Keyword database could not be loaded: {e}")
+    main.create_openai_client()
+    user_inputs = [line.strip() for line in args.input if line.strip()]
+    asyncio.run(run(snapshot, user_inputs, args.output, args.concurrency))
@@ -0,0 +1,62 @@
+# backend/bench/bench_similarity.py
+"""Micro-benchmark of the step-2 similarity search alone (no network).
+
+    python bench_similarity.py --sizes 10000,100000 --dim 1536 --queries 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann import IVFIndex  # noqa: E402
+from retrieval import KeywordIndex, normalize_rows  # noqa: E402
+
+
+def timeit(fn, repeat):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench(size, dim, n_queries, top_k, repeat, nprobes, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = normalize_rows(rng.standard_normal((size, dim), dtype=np.float32))
+    keywords = [f"keyword {i}" for i in range(size)]
+    queries = normalize_rows(rng.standard_normal((n_queries, dim), dtype=np.float32))
+
+    index = KeywordIndex(keywords, vectors, normalized=True)
+    rows = [("exact top_k", timeit(lambda: index.top_k(queries, top_k), repeat))]
+    rows.append(("exact search", timeit(lambda: index.search(queries, top_k), repeat)))
+
+    if nprobes:
+        start = time.perf_counter()
+        ann = IVFIndex.build(vectors)
+        print(f"  IVF build ({ann.n_lists} lists): {time.perf_counter() - start:.2f}s")
+        for nprobe in nprobes:
+            ann_index = KeywordIndex(keywords, vectors, ann=ann, nprobe=nprobe, normalized=True)
+            rows.append((f"ivf nprobe={nprobe}", timeit(lambda: ann_index.top_k(queries, top_k), repeat)))
+
+    print(f"size={size} dim={dim} queries={n_queries} ({vectors.nbytes / 2**20:.0f} MB)")
+    for name, ms in rows:
+        print(f"  {name:<18} {ms:9.3f} ms/call")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword similarity search")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--nprobes", default="", help="comma-separated nprobe values to also benchmark IVF")
+    args = parser.parse_args()
+
+    nprobes = [int(n) for n in args.nprobes.split(",") if n]
+    for size in (int(s) for s in args.sizes.split(",")):
+        bench(size, args.dim, args.queries, args.top_k, args.repeat, nprobes)
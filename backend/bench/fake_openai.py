@@ -0,0 +1,116 @@
+# backend/bench/fake_openai.py
+"""Local stand-in for the OpenAI API used by the benchmarks.
+
+Serves /v1/chat/completions (plain and streamed) and /v1/embeddings with
+deterministic output and configurable artificial latency:
+
+    FAKE_CHAT_LATENCY_MS=800 FAKE_EMBEDDING_LATENCY_MS=150 FAKE_EMBEDDING_DIM=1536 \\
+        uvicorn fake_openai:app --port 9000
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:9000/v1.
+Expansion prompts are answered with keywords from the synthetic vocabulary
+written by synth_cache.py, so step 2 finds real candidates.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+CHAT_LATENCY = float(os.getenv("FAKE_CHAT_LATENCY_MS", "800")) / 1000
+EMBEDDING_LATENCY = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "150")) / 1000
+EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "1536"))
+VOCAB_SIZE = int(os.getenv("FAKE_VOCAB_SIZE", "10000"))
+STREAM_CHUNKS = 8
+
+app = FastAPI()
+
+
+def synthetic_keyword(i):
+    return f"synthetic keyword {i}"
+
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "little")
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    """Deterministic unit vector for `text`."""
+    vector = np.random.default_rng(_seed(text.lower())).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _answer(messages):
+    prompt = messages[-1]["content"]
+    candidates = re.search(r"Database Candidates:\s*(.*)", prompt)
+    if candidates:
+        picked = [c.strip() for c in candidates.group(1).split(",") if c.strip()][:8]
+        if len(picked) >= 2:
+            picked[-1] = f"{picked[-2]} + {picked[-1]}"
+        return ", ".join(picked)
+    rng = np.random.default_rng(_seed(prompt))
+    return ", ".join(synthetic_keyword(i) for i in rng.choice(VOCAB_SIZE, 10, replace=False))
+
+
+def _usage(messages, content):
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    content = _answer(body["messages"])
+    base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body["model"]}
+
+    if not body.get("stream"):
+        await asyncio.sleep(CHAT_LATENCY)
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": _usage(body["messages"], content),
+        }
+
+    async def events():
+        # Spend half the latency before the first token, the rest spread over the chunks
+        await asyncio.sleep(CHAT_LATENCY / 2)
+        size = max(1, len(content) // STREAM_CHUNKS + 1)
+        for start in range(0, len(content), size):
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": content[start:start + size]}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(CHAT_LATENCY / 2 / STREAM_CHUNKS)
+        if body.get("stream_options", {}).get("include_usage"):
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [], "usage": _usage(body["messages"], content)}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(EMBEDDING_LATENCY)
+
+    data = []
+    for i, text in enumerate(texts):
+        vector = fake_embedding(text)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+        else:
+            embedding = vector.tolist()
+        data.append({"object": "embedding", "index": i, "embedding": embedding})
+    tokens = sum(len(t) for t in texts) // 4
+    return {"object": "list", "data": data, "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
@@ -0,0 +1,203 @@
+# backend/bench/load_test.py
+"""Load driver for the /recommend pipeline.
+
+Against a running backend:
+
+    python load_test.py --url http://127.0.0.1:8000 --concurrency 32 --requests 500
+
+Or let it start the fake OpenAI server and the backend on a synthetic store:
+
+    python synth_cache.py 100000 -o /tmp/bench/keyword_cache.kwc
+    python load_test.py --spawn --store /tmp/bench/keyword_cache.kwc --workers 2
+
+Reports requests/s, p50/p95/p99 latency, errors and resident memory per
+backend worker (read from /proc, so Linux only).
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+BASE_PROMPTS = [
+    "Something funny and upbeat",
+    "90s nostalgia",
+    "Intense love stories",
+    "Mind-bending thriller",
+    "Cozy rainy day movie",
+    "Epic adventure",
+    "Dark comedy",
+    "Feel-good family film",
+]
+
+
+def make_prompts(n, repeat_ratio, seed=0):
+    """`repeat_ratio` of the prompts come from a small hot set; the rest are unique."""
+    rng = np.random.default_rng(seed)
+    prompts = []
+    for i in range(n):
+        base = BASE_PROMPTS[i % len(BASE_PROMPTS)]
+        prompts.append(base if rng.random() < repeat_ratio else f"{base} {uuid.uuid4().hex[:8]}")
+    return prompts
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return children
+
+
+async def drive(url, endpoint, prompts, concurrency, timeout):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for prompt in prompts:
+        queue.put_nowait(prompt)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                prompt = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json={"user_input": prompt})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def report(latencies, errors, elapsed, pids):
+    total = len(latencies) + errors
+    print(f"requests:     {total} ({errors} errors) in {elapsed:.2f}s")
+    print(f"throughput:   {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+        print(f"latency (ms): p50={p50:.1f}  p95={p95:.1f}  p99={p99:.1f}  max={max(latencies) * 1000:.1f}")
+    for pid in pids:
+        rss = rss_mb(pid)
+        if rss is not None:
+            print(f"worker {pid}: {rss:.1f} MB RSS")
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+def spawn_stack(args):
+    """Start the fake OpenAI server and the backend; return (backend_url, processes)."""
+    workdir = os.path.dirname(os.path.abspath(args.store))
+    dim = int(args.dim) if args.dim else None
+    if dim is None:
+        sys.path.insert(0, BACKEND_DIR)
+        from keyword_store import open_store
+        dim = open_store(args.store).header["dim"]
+
+    env = {
+        **os.environ,
+        "FAKE_CHAT_LATENCY_MS": str(args.chat_latency_ms),
+        "FAKE_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+        "FAKE_EMBEDDING_DIM": str(dim),
+        "FAKE_VOCAB_SIZE": str(args.vocab_size),
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "KEYWORD_STORE_FILE": os.path.abspath(args.store),
+        "PREWARM_PROMPTS": "",
+    }
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--app-dir", BENCH_DIR, "fake_openai:app",
+         "--port", str(args.fake_port), "--log-level", "warning"],
+        env=env, cwd=workdir,
+    )
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--app-dir", BACKEND_DIR, "main:app",
+         "--port", str(args.backend_port), "--workers", str(args.workers), "--log-level", "warning"],
+        env=env, cwd=workdir,
+    )
+    url = f"http://127.0.0.1:{args.backend_port}"
+    wait_ready(f"http://127.0.0.1:{args.fake_port}/docs")
+    wait_ready(f"{url}/health/ready")
+    return url, [fake, backend]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the recommendation backend")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="/recommend")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--repeat-ratio", type=float, default=0.0,
+                        help="fraction of requests drawn from the hot starter-prompt set")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--pids", default="", help="comma-separated backend pids to report RSS for")
+    parser.add_argument("--spawn", action="store_true", help="start the fake OpenAI server and backend")
+    parser.add_argument("--store", default="keyword_cache.kwc")
+    parser.add_argument("--dim", default=None)
+    parser.add_argument("--vocab-size", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chat-latency-ms", type=float, default=800)
+    parser.add_argument("--embedding-latency-ms", type=float, default=150)
+    parser.add_argument("--fake-port", type=int, default=9000)
+    parser.add_argument("--backend-port", type=int, default=8000)
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    pids = [int(p) for p in args.pids.split(",") if p]
+    try:
+        if args.spawn:
+            url, processes = spawn_stack(args)
+            backend_pid = processes[1].pid
+            pids = child_pids(backend_pid) if args.workers > 1 else [backend_pid]
+        prompts = make_prompts(args.requests, args.repeat_ratio)
+        report(*asyncio.run(drive(url, args.endpoint, prompts, args.concurrency, args.timeout)), pids)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
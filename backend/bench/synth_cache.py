@@ -0,0 +1,53 @@
+# backend/bench/synth_cache.py
+"""Write a synthetic keyword store for benchmarking.
+
+    python synth_cache.py 100000 -o synthetic_100k.kwc [--dim 1536] [--ann] [--dtype int8]
+
+Keyword i is "synthetic keyword i" with the same deterministic embedding the
+fake OpenAI server returns for that text. A 1M x 1536 float32 store is about
+6 GB; use --dim to shrink it (and set FAKE_EMBEDDING_DIM to match).
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann import IVFIndex  # noqa: E402
+from fake_openai import fake_embedding, synthetic_keyword  # noqa: E402
+from keyword_store import open_store, write_store  # noqa: E402
+
+
+def synth_store(path, size, dim, ann_path=None, dtype="float32"):
+    start = time.perf_counter()
+    keywords = [synthetic_keyword(i) for i in range(size)]
+    vectors = np.empty((size, dim), dtype=np.float32)
+    for i, keyword in enumerate(keywords):
+        vectors[i] = fake_embedding(keyword, dim)
+    header = write_store(path, keywords, vectors, "text-embedding-3-small", dtype=dtype)
+    print(f"Wrote {path}: {size} keywords x {dim} dims ({dtype}) in {time.perf_counter() - start:.1f}s")
+
+    if ann_path:
+        start = time.perf_counter()
+        ann = IVFIndex.build(np.asarray(open_store(path).vectors[:], dtype=np.float32))
+        ann.save(ann_path)
+        print(f"Wrote {ann_path}: {ann.n_lists} lists in {time.perf_counter() - start:.1f}s")
+    return header
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic keyword store")
+    parser.add_argument("size", type=int, help="number of keywords, e.g. 10000, 100000, 1000000")
+    parser.add_argument("-o", "--output", default=None)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--ann", action="store_true", help="also build keyword_ivf.npz next to the store")
+    parser.add_argument("--dtype", choices=("float32", "float16", "int8"), default="float32",
+                        help="precision the backend scans (float32 is kept for re-scoring)")
+    args = parser.parse_args()
+
+    output = args.output or f"synthetic_{args.size}.kwc"
+    ann_path = os.path.join(os.path.dirname(os.path.abspath(output)), "keyword_ivf.npz") if args.ann else None
+    synth_store(output, args.size, args.dim, ann_path, args.dtype)
@@ -0,0 +1,164 @@
+# backend/embedding_cache.py
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from singleflight import consume_exception
+
+
+def normalize_text(text):
+    """Cache key form of a keyword: case-folded with collapsed whitespace."""
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache:
+    """Two-tier cache for query embeddings keyed by (model, normalized text).
+
+    Tier 1 is an in-process LRU bounded by `max_entries`. Tier 2 is an optional
+    SQLite file (`db_path`) that survives restarts; disk hits are promoted to
+    the LRU; its reads and writes run in worker threads, never on the event
+    loop. Concurrent misses for the same text share one upstream fetch.
+    """
+
+    def __init__(self, max_entries=10000, db_path=None):
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def get(self, model, text):
+        """In-memory lookup only; the disk tier is read by `embed()` off the event loop."""
+        key = (model, normalize_text(text))
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+            return vector
+
+    def _disk_get_many(self, model, keys):
+        found = {}
+        with self._db_lock:
+            for start in range(0, len(keys), 500):  # stay under SQLite's variable limit
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT text, vector FROM embeddings WHERE model = ? AND text IN ({','.join('?' * len(chunk))})",
+                    (model, *chunk),
+                ).fetchall()
+                found.update((text, np.frombuffer(blob, dtype=np.float32)) for text, blob in rows)
+        return found
+
+    def _disk_put_many(self, rows):
+        with self._db_lock:
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    async def _disk_lookup(self, model, keys):
+        """Promote disk hits for `keys` (normalized texts) to the LRU; returns {key: vector}."""
+        if self._db is None or not keys:
+            return {}
+        found = await asyncio.to_thread(self._disk_get_many, model, keys)
+        with self._lock:
+            for key, vector in found.items():
+                self._remember((model, key), vector)
+        self.disk_hits += len(found)
+        return found
+
+    def put_many(self, model, texts, vectors):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = (model, normalize_text(text))
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((*key, vector.tobytes()))
+        if self._db is not None and rows:
+            # The commit (an fsync) runs in a worker thread and nobody waits for it
+            task = asyncio.ensure_future(asyncio.to_thread(self._disk_put_many, rows))
+            task.add_done_callback(consume_exception)
+
+    async def embed(self, model, texts, fetch):
+        """Return an (n, dim) float32 matrix for `texts`.
+
+        Only the distinct cache misses are passed to `fetch(texts)`, an async
+        callable returning one vector per input, in a single call. Texts are
+        matched case- and whitespace-insensitively, but the text sent upstream
+        is the first original spelling.
+        """
+        keys = [normalize_text(t) for t in texts]
+        vectors = [self.get(model, text) for text in texts]
+        originals = OrderedDict()
+        for text, key, vector in zip(texts, keys, vectors):
+            if vector is None:
+                originals.setdefault(key, text)
+        found = await self._disk_lookup(model, list(originals))
+        missing = {key: text for key, text in originals.items() if key not in found}
+        self.misses += sum(1 for key, v in zip(keys, vectors) if v is None and key in missing)
+        if missing:
+            found.update(await self._fetch_missing(model, missing, fetch))
+        vectors = [v if v is not None else found[key] for key, v in zip(keys, vectors)]
+        return np.vstack(vectors).astype(np.float32)
+
+    async def _fetch_missing(self, model, missing, fetch):
+        """`missing` maps normalized keys to the original text to embed."""
+        owned = [key for key in missing if (model, key) not in self._inflight]
+        if owned:
+            task = asyncio.ensure_future(self._fetch_and_store(model, [missing[key] for key in owned], fetch))
+            for i, key in enumerate(owned):
+                self._inflight[(model, key)] = (task, i)
+            task.add_done_callback(lambda _: [self._inflight.pop((model, key), None) for key in owned])
+            task.add_done_callback(consume_exception)
+        self.coalesced += len(missing) - len(owned)
+
+        pending = {key: self._inflight[(model, key)] for key in missing}
+        fetched = {}
+        for key, (task, i) in pending.items():
+            fetched[key] = (await asyncio.shield(task))[i]
+        return fetched
+
+    async def _fetch_and_store(self, model, texts, fetch):
+        vectors = [np.asarray(v, dtype=np.float32) for v in await fetch(texts)]
+        self.put_many(model, texts, vectors)
+        return vectors
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "disk_tier": self._db is not None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
@@ -1,18 +1,148 @@
 # backend/generate_cache.py
 import pandas as pd
 import numpy as np
-import pickle
-from openai import OpenAI
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
+import random
+import shutil
+
+from ann import ANN_FILE, IVFIndex
+from keyword_store import STORE_FILE, load_keywords, open_store, write_store
+from movie_index import MOVIE_INDEX_FILE, MovieIndex
+from quantize import quantization_report
+from retrieval import normalize_rows
 
 # .env 파일 로드
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # 파일 경로 설정 (프로젝트 루트 기준으로)
 CSV_FILE = "../data/movies_keywords.csv"
-CACHE_FILE = "keyword_cache.pkl"
+CACHE_FILE = STORE_FILE
+LEGACY_CACHE_FILE = "keyword_cache.pkl"
+# 완료된 배치를 저장해 두는 디렉토리 (중단된 실행을 이어서 진행할 때 사용)
+CHECKPOINT_DIR = "keyword_cache.checkpoint"
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# 한 번에 2048개까지 임베딩 가능
+BATCH_SIZE = 2048
+# 동시에 요청하는 배치 수와 재시도 설정 (rate limit 대응)
+MAX_CONCURRENT_BATCHES = int(os.getenv("MAX_CONCURRENT_BATCHES", "4"))
+MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
+
+# 이 개수 이상이면 근사 최근접 이웃(IVF) 인덱스도 함께 생성
+ANN_MIN_KEYWORDS = int(os.getenv("ANN_MIN_KEYWORDS", "50000"))
+
+# 검색에 사용할 벡터 정밀도: float32(기본), float16, int8(차원별 스케일)
+# 압축 저장 시 CACHE_FULL_PRECISION=0 이면 float32 원본을 저장하지 않음 (재채점 불가)
+VECTOR_DTYPE = os.getenv("CACHE_VECTOR_DTYPE", "float32")
+FULL_PRECISION = os.getenv("CACHE_FULL_PRECISION", "1") == "1"
+# float32 원본이 없는 기존 캐시의 압축 벡터는 기본적으로 재사용하지 않고 다시 임베딩
+# (복원한 벡터를 다시 양자화하면 빌드할 때마다 오차가 누적됨). 1이면 경고 후 재사용
+REUSE_COMPACT_VECTORS = os.getenv("CACHE_REUSE_COMPACT", "0") == "1"
+
+# 키워드→영화 역색인에 사용할 영화 식별 컬럼 (없으면 아래 후보 중 CSV에 있는 첫 컬럼)
+MOVIE_ID_COLUMN = os.getenv("MOVIE_ID_COLUMN")
+MOVIE_ID_CANDIDATES = ("movie_id", "id", "tmdb_id", "imdb_id", "title")
+
+def load_existing_vectors():
+    """기존 캐시와 체크포인트에서 이미 임베딩된 {키워드: 벡터}를 불러옴"""
+    existing = {}
+    if os.path.exists(CACHE_FILE):
+        store = open_store(CACHE_FILE)
+        if store.header["model"] != EMBEDDING_MODEL:
+            print(f"기존 캐시의 모델({store.header['model']})이 달라 전체를 다시 임베딩합니다.")
+        elif store.full_precision:
+            existing.update(zip(store.keywords, store.vectors))
+        elif REUSE_COMPACT_VECTORS:
+            print(f"⚠️  기존 캐시에 float32 원본이 없어 {store.header['dtype']} 벡터를 복원해 재사용합니다. "
+                  "양자화 오차가 누적되므로 CACHE_REUSE_COMPACT=0으로 다시 임베딩하는 것을 권장합니다.")
+            existing.update(zip(store.keywords, store.vectors))
+        else:
+            print(f"기존 캐시에 float32 원본이 없어 전체를 다시 임베딩합니다. "
+                  f"({store.header['dtype']} 벡터를 재사용하려면 CACHE_REUSE_COMPACT=1)")
+    elif os.path.exists(LEGACY_CACHE_FILE):
+        keywords, vectors = load_keywords(LEGACY_CACHE_FILE)
+        existing.update(zip(keywords, vectors))
+
+    if os.path.isdir(CHECKPOINT_DIR):
+        for name in sorted(os.listdir(CHECKPOINT_DIR)):
+            if name.endswith(".tmp.npz"):
+                continue
+            data = np.load(os.path.join(CHECKPOINT_DIR, name), allow_pickle=False)
+            existing.update(zip(data["keywords"].tolist(), data["vectors"]))
+    return existing
+
+def build_movie_index(df, keywords, store_version):
+    """CSV의 (키워드, 영화) 쌍으로 키워드 행 → 정렬된 영화 ID 배열 역색인을 생성"""
+    column = MOVIE_ID_COLUMN or next((c for c in MOVIE_ID_CANDIDATES if c in df.columns), None)
+    if column is None or column not in df.columns:
+        print(f"영화 ID 컬럼을 찾지 못해 역색인을 건너뜁니다. (MOVIE_ID_COLUMN으로 지정, 후보: {MOVIE_ID_CANDIDATES})")
+        return None
+
+    # 영화 ID는 0부터 시작하는 정수 코드로 변환 (문자열 ID/제목도 가능)
+    movie_codes, movies = pd.factorize(df[column])
+    row_of = {keyword: i for i, keyword in enumerate(keywords)}
+    keyword_rows = df['keyword'].astype(str).map(row_of)
+    valid = (movie_codes >= 0) & df['keyword'].notna().to_numpy() & keyword_rows.notna().to_numpy()
+    return MovieIndex.build(
+        keyword_rows[valid].to_numpy(dtype=np.int64),
+        movie_codes[valid],
+        len(keywords),
+        len(movies),
+        store_version,
+    )
+
+def retry_delay(error, attempt):
+    # 서버가 Retry-After를 알려주면 그 값을, 아니면 지수 백오프 + 지터
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+async def embed_batch(batch_keywords, semaphore):
+    async with semaphore:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = await client.embeddings.create(
+                    input=batch_keywords,
+                    model=EMBEDDING_MODEL
+                )
+                break
+            except RETRYABLE_ERRORS as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = retry_delay(e, attempt)
+                print(f"  재시도 {attempt + 1}/{MAX_RETRIES} ({type(e).__name__}), {delay:.1f}초 후...")
+                await asyncio.sleep(delay)
+
+    vectors = np.array([data.embedding for data in response.data]).astype('float32')
+    # 배치 내용 기반의 파일명으로 체크포인트 저장
+    digest = hashlib.sha1("\n".join(batch_keywords).encode("utf-8")).hexdigest()[:16]
+    tmp_path = os.path.join(CHECKPOINT_DIR, f"batch_{digest}.tmp.npz")
+    np.savez(tmp_path, keywords=np.array(batch_keywords), vectors=vectors)
+    os.replace(tmp_path, os.path.join(CHECKPOINT_DIR, f"batch_{digest}.npz"))
+    return batch_keywords, vectors
+
+async def embed_missing(missing):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+    tasks = [
+        embed_batch(missing[i:i + BATCH_SIZE], semaphore)
+        for i in range(0, len(missing), BATCH_SIZE)
+    ]
+    embedded = {}
+    for task in asyncio.as_completed(tasks):
+        batch_keywords, vectors = await task
+        embedded.update(zip(batch_keywords, vectors))
+        print(f"  {len(embedded)} / {len(missing)} 키워드 임베딩 완료.")
+    return embedded
 
 def create_embedding_cache():
     try:
@@ -22,47 +152,56 @@ def create_embedding_cache():
         return
 
     # CSV에 'keyword' 컬럼이 있다고 가정
-    keywords = df['keyword'].unique().tolist()
-    
+    keywords = df['keyword'].dropna().astype(str).unique().tolist()
+
     if not keywords:
         print("No keywords found in the CSV file. Please check the 'keyword' column.")
         return
 
-    print(f"{len(keywords)}개의 키워드 임베딩 중... 이 과정은 시간이 소요될 수 있습니다.")
-    
-    # OpenAI 임베딩 생성 (비용 절감을 위해 배치 처리)
-    # 한 번에 2048개까지 임베딩 가능
-    batch_size = 2048
-    all_vectors = []
-    for i in range(0, len(keywords), batch_size):
-        batch_keywords = keywords[i:i + batch_size]
+    # 증분 빌드: 기존 캐시/체크포인트에 없는 키워드만 임베딩, CSV에서 빠진 키워드는 제거
+    existing = load_existing_vectors()
+    missing = [k for k in keywords if k not in existing]
+    removed = len(set(existing) - set(keywords))
+    print(f"전체 {len(keywords)}개 중 {len(missing)}개 키워드 임베딩 필요 (재사용 {len(keywords) - len(missing)}개, 제거 {removed}개)")
+
+    if missing:
         try:
-            response = client.embeddings.create(
-                input=batch_keywords,
-                model="text-embedding-3-small"
-            )
-            batch_vectors = [data.embedding for data in response.data]
-            all_vectors.extend(batch_vectors)
-            print(f"  {len(all_vectors)} / {len(keywords)} 키워드 임베딩 완료.")
+            existing.update(asyncio.run(embed_missing(missing)))
         except Exception as e:
             print(f"임베딩 중 오류 발생: {e}")
-            print(f"현재까지 {len(all_vectors)}개 키워드만 임베딩되었습니다.")
-            break # 오류 발생 시 중단
-    
-    if not all_vectors:
-        print("임베딩된 벡터가 없습니다. API 키와 네트워크 연결을 확인하세요.")
-        return
+            print(f"완료된 배치는 '{CHECKPOINT_DIR}'에 저장되었습니다. 다시 실행하면 이어서 진행합니다.")
+            return
+
+    # 키워드와 벡터를 mmap 가능한 바이너리 포맷으로 저장 (헤더: 모델명, 차원, 개수, 정밀도, 체크섬)
+    vectors = normalize_rows(np.vstack([existing[k] for k in keywords]).astype('float32'))
+    header = write_store(
+        CACHE_FILE,
+        keywords,
+        vectors,
+        EMBEDDING_MODEL,
+        dtype=VECTOR_DTYPE,
+        full_precision=FULL_PRECISION,
+    )
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+
+    print(f"캐시 파일 '{CACHE_FILE}' 생성 완료! (버전 {header['checksum'][:16]}, {VECTOR_DTYPE})")
+
+    # 키워드 조합("A + B")이 실제 영화와 매칭되는지 확인하기 위한 역색인 (벡터와 같은 디렉토리에 저장)
+    movie_index = build_movie_index(df, keywords, header["checksum"][:16])
+    if movie_index is not None:
+        movie_index.save(MOVIE_INDEX_FILE)
+        print(f"영화 역색인 '{MOVIE_INDEX_FILE}' 생성 완료! ({movie_index.n_movies}개 영화, "
+              f"{len(movie_index.movie_ids)}개 키워드-영화 쌍)")
+
+    # 압축 저장 시 절약된 메모리와 recall 변화를 리포트
+    if VECTOR_DTYPE != "float32":
+        quantization_report(vectors, VECTOR_DTYPE)
 
-    # 키워드와 벡터를 매핑하여 딕셔너리로 저장
-    cache_data = {
-        "keywords": keywords,
-        "vectors": np.array(all_vectors).astype('float32')
-    }
-    
-    with open(CACHE_FILE, 'wb') as f:
-        pickle.dump(cache_data, f)
-    
-    print(f"캐시 파일 '{CACHE_FILE}' 생성 완료!")
+    # 대용량 DB용 IVF 인덱스 생성 (벡터와 같은 디렉토리에 저장)
+    if header["rows"] >= ANN_MIN_KEYWORDS:
+        ann = IVFIndex.build(vectors, store_version=header["checksum"][:16])
+        ann.save(ANN_FILE)
+        print(f"ANN 인덱스 '{ANN_FILE}' 생성 완료! ({ann.n_lists}개 리스트)")
 
 if __name__ == "__main__":
-    create_embedding_cache()
\ No newline at end of file
+    create_embedding_cache()
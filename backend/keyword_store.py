@@ -0,0 +1,257 @@
+# backend/keyword_store.py
+"""Versioned binary keyword store that worker processes can share via mmap.
+
+Layout (little-endian):
+
+    magic "KWSTORE\\0" | uint32 format version | uint32 header length | header JSON
+    keyword offsets (uint64, rows + 1) | keyword UTF-8 blob
+    vector block (rows x dim, float32, 64-byte aligned)
+    [compact block (rows x dim, float16 or int8) | int8 scales (dim, float32)]
+
+The header records the embedding model, dimension, row count, the byte
+offsets of each section and a SHA-256 checksum over the keyword table and
+vector blocks. `dtype` is the precision searches scan; for float16/int8
+stores the float32 block is optional (`full_precision`) and, when present,
+only the rows that get re-scored are ever paged in.
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+from quantize import QUANTIZED_DTYPES, QuantizedVectors, quantize
+from retrieval import normalize_rows
+
+MAGIC = b"KWSTORE\0"
+FORMAT_VERSION = 2
+# Version 1 stores (float32 only) are still readable
+READABLE_VERSIONS = (1, 2)
+STORE_FILE = "keyword_cache.kwc"
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+
+
+class KeywordTable:
+    """Read-only sequence of keywords decoded lazily from the string table."""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("keyword index out of range")
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class KeywordStore:
+    """An opened store: header dict, lazily-decoded keywords and memory-mapped vectors.
+
+    `vectors` is the float32 block, or the compact vectors (decoded per row)
+    when the store was written without full precision; `compact` is None for
+    float32 stores.
+    """
+
+    def __init__(self, path, header, keywords, vectors, compact=None):
+        self.path = path
+        self.header = header
+        self.keywords = keywords
+        self.vectors = vectors
+        self.compact = compact
+
+    @property
+    def full_precision(self):
+        return self.header.get("full_precision", True)
+
+    @property
+    def version(self):
+        return self.header["checksum"][:16]
+
+    def verify(self):
+        if _checksum(self.path, self.header) != self.header["checksum"]:
+            raise ValueError(f"Checksum mismatch in {self.path}")
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _sections(header):
+    """(start, end) byte ranges covered by the checksum."""
+    rows, dim = header["rows"], header["dim"]
+    sections = [(header["offsets_offset"], header["strings_offset"] + header["strings_length"])]
+    if header.get("full_precision", True):
+        sections.append((header["vectors_offset"], header["vectors_offset"] + rows * dim * 4))
+    if header["dtype"] in QUANTIZED_DTYPES:
+        itemsize = np.dtype(header["dtype"]).itemsize
+        sections.append((header["compact_offset"], header["compact_offset"] + rows * dim * itemsize))
+    if header["dtype"] == "int8":
+        sections.append((header["scales_offset"], header["scales_offset"] + dim * 4))
+    return sections
+
+
+def _checksum(path, header, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for start, end in _sections(header):
+            f.seek(start)
+            remaining = end - start
+            while remaining:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise ValueError(f"Truncated keyword store: {path}")
+                digest.update(chunk)
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def write_store(path, keywords, vectors, model, dtype="float32", full_precision=True):
+    """Write `keywords` and their embeddings (L2-normalized on write) to `path` atomically.
+
+    With `dtype` "float16" or "int8" a compact copy is written for scanning;
+    `full_precision=False` then drops the float32 block altogether.
+    """
+    vectors = normalize_rows(vectors)
+    rows, dim = vectors.shape
+    if rows != len(keywords):
+        raise ValueError(f"{len(keywords)} keywords but {rows} vectors")
+    compact, scales = quantize(vectors, dtype) if dtype != "float32" else (None, None)
+    full_precision = full_precision or compact is None
+
+    encoded = [k.encode("utf-8") for k in keywords]
+    offsets = np.zeros(rows + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = b"".join(encoded)
+
+    header = {
+        "model": model,
+        "dim": dim,
+        "rows": rows,
+        "dtype": dtype,
+        "full_precision": full_precision,
+        "normalized": True,
+    }
+    # Section offsets depend on the header length, which depends on the offsets;
+    # reserve generous fixed-width fields and pad the header to a stable size.
+    for key in ("offsets_offset", "strings_offset", "strings_length", "vectors_offset",
+                "compact_offset", "scales_offset"):
+        header[key] = 0
+    header["checksum"] = "0" * 64
+    header_size = len(json.dumps(header).encode("utf-8")) + 128
+
+    offsets_offset = PREAMBLE.size + header_size
+    strings_offset = offsets_offset + offsets.nbytes
+    vectors_offset = _align(strings_offset + len(blob))
+    compact_offset = _align(vectors_offset + (vectors.nbytes if full_precision else 0))
+    scales_offset = _align(compact_offset + (compact.nbytes if compact is not None else 0))
+    header.update(
+        offsets_offset=offsets_offset,
+        strings_offset=strings_offset,
+        strings_length=len(blob),
+        vectors_offset=vectors_offset,
+        compact_offset=compact_offset,
+        scales_offset=scales_offset,
+    )
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"\0" * offsets_offset)
+        f.write(offsets.tobytes())
+        f.write(blob)
+        f.write(b"\0" * (vectors_offset - strings_offset - len(blob)))
+        if full_precision:
+            f.write(vectors.astype("<f4").tobytes())
+        if compact is not None:
+            f.write(b"\0" * (compact_offset - f.tell()))
+            f.write(compact.astype(compact.dtype.newbyteorder("<")).tobytes())
+        if scales is not None:
+            f.write(b"\0" * (scales_offset - f.tell()))
+            f.write(scales.astype("<f4").tobytes())
+
+    header["checksum"] = _checksum(tmp_path, header)
+    header_bytes = json.dumps(header).encode("utf-8")
+    if len(header_bytes) > header_size:
+        raise ValueError("Keyword store header does not fit its reserved space")
+    header_bytes = header_bytes.ljust(header_size, b" ")
+    with open(tmp_path, "r+b") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_size))
+        f.write(header_bytes)
+    os.replace(tmp_path, path)
+    return header
+
+
+def open_store(path=STORE_FILE, verify=False):
+    """Memory-map a keyword store; pages are shared between processes by the OS."""
+    with open(path, "rb") as f:
+        magic, version, header_size = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a keyword store")
+        if version not in READABLE_VERSIONS:
+            raise ValueError(f"Unsupported keyword store version {version}")
+        header = json.loads(f.read(header_size))
+
+    rows, dim = header["rows"], header["dim"]
+    offsets = np.memmap(path, dtype="<u8", mode="r", offset=header["offsets_offset"], shape=(rows + 1,))
+    blob = np.memmap(path, dtype=np.uint8, mode="r", offset=header["strings_offset"], shape=(header["strings_length"],))
+    compact = None
+    if header["dtype"] in QUANTIZED_DTYPES:
+        data = np.memmap(path, dtype=np.dtype(header["dtype"]).newbyteorder("<"), mode="r",
+                         offset=header["compact_offset"], shape=(rows, dim))
+        scales = None
+        if header["dtype"] == "int8":
+            scales = np.array(np.memmap(path, dtype="<f4", mode="r", offset=header["scales_offset"], shape=(dim,)))
+        compact = QuantizedVectors(data, scales)
+    if header.get("full_precision", True):
+        vectors = np.memmap(path, dtype="<f4", mode="r", offset=header["vectors_offset"], shape=(rows, dim))
+    else:
+        vectors = compact
+
+    store = KeywordStore(path, header, KeywordTable(offsets, blob), vectors, compact)
+    if verify:
+        store.verify()
+    return store
+
+
+def convert_pickle(pickle_path, store_path=STORE_FILE, model="text-embedding-3-small"):
+    """Convert a legacy keyword_cache.pkl into the binary store format."""
+    with open(pickle_path, "rb") as f:
+        cache = pickle.load(f)
+    return write_store(store_path, cache["keywords"], cache["vectors"], model)
+
+
+def load_keywords(path):
+    """Return (keywords, vectors) from either a keyword store or a legacy pickle."""
+    with open(path, "rb") as f:
+        is_store = f.read(len(MAGIC)) == MAGIC
+    if is_store:
+        store = open_store(path)
+        return store.keywords, store.vectors
+    with open(path, "rb") as f:
+        cache = pickle.load(f)
+    return cache["keywords"], cache["vectors"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert keyword_cache.pkl to the mmap keyword store format")
+    parser.add_argument("pickle_file", nargs="?", default="keyword_cache.pkl")
+    parser.add_argument("store_file", nargs="?", default=STORE_FILE)
+    parser.add_argument("--model", default="text-embedding-3-small")
+    args = parser.parse_args()
+
+    header = convert_pickle(args.pickle_file, args.store_file, args.model)
+    print(f"✅ Wrote {args.store_file}: {header['rows']} keywords x {header['dim']} dims ({header['checksum'][:16]})")
@@ -0,0 +1,64 @@
+# backend/lexical.py
+import re
+from collections import defaultdict
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def lexical_key(text):
+    """Normalized form for lexical matching: lower-case, punctuation folded to single spaces."""
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LexicalIndex:
+    """Exact and near-exact keyword lookup without embeddings.
+
+    Exact matches go through a hash map of normalized keywords. Near-exact
+    matches use a character-trigram inverted index scored by the Dice
+    coefficient; trigrams shared by more than `max_posting` keywords are
+    ignored when gathering candidates, as they carry little signal.
+    """
+
+    def __init__(self, keywords, fuzzy_threshold=0.85, max_posting=5000, fuzzy=True):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_posting = max_posting
+        self.exact = {}
+        postings = defaultdict(list)
+        gram_counts = []
+        for i, keyword in enumerate(keywords):
+            key = lexical_key(keyword)
+            self.exact.setdefault(key, i)
+            if fuzzy:
+                grams = trigrams(key)
+                gram_counts.append(len(grams))
+                for gram in grams:
+                    postings[gram].append(i)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self.gram_counts = np.array(gram_counts, dtype=np.int32)
+
+    def lookup(self, text):
+        """Return (keyword index, score) for the best lexical match, or None."""
+        key = lexical_key(text)
+        index = self.exact.get(key)
+        if index is not None:
+            return index, 1.0
+        if not self.postings or not key:
+            return None
+
+        grams = trigrams(key)
+        lists = [self.postings[g] for g in grams if g in self.postings and len(self.postings[g]) <= self.max_posting]
+        if not lists:
+            return None
+        ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        dice = 2 * shared / (len(grams) + self.gram_counts[ids])
+        best = int(np.argmax(dice))
+        if dice[best] < self.fuzzy_threshold:
+            return None
+        return int(ids[best]), float(dice[best])
@@ -1,13 +1,39 @@
+import time
+
+# Cold-start reference point; everything below counts towards time-to-listen
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import json
 import numpy as np
 import pickle
-from openai import OpenAI
-from sklearn.metrics.pairwise import cosine_similarity
-from fastapi import FastAPI, HTTPException
+from contextlib import aclosing, asynccontextmanager, nullcontext
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+from typing import Literal, Optional
 from dotenv import load_dotenv
 import os
-import uvicorn
+
+from ann import ANN_FILE, IVFIndex
+from embedding_cache import EmbeddingCache, normalize_text
+from result_cache import ResultCache
+from metrics import (
+    CACHE_RELOADS, CANDIDATES, IN_FLIGHT, LEXICAL_LOOKUPS, PROMPT_TOKENS, REQUEST_SECONDS, record_usage, render_metrics,
+    server_timing_header, stage_timer, start_request_timings,
+)
+from microbatch import MicroBatcher
+from movie_index import MOVIE_INDEX_FILE, MovieIndex
+from prompts import expansion_messages, fit_candidates, load_encoding, message_tokens, verification_messages
+from rerank import rerank
+from resilience import CircuitOpen, DeadlineExceeded, Overloaded, Unavailable, UpstreamGuard
+from singleflight import SingleFlight, consume_exception
+from keyword_store import STORE_FILE, open_store
+from lexical import LexicalIndex
+from retrieval import KeywordIndex
+from snapshot import CacheSnapshot, file_signature, file_tag
+from startup import StartupProgress, process_age
 
 # 1. Load environment variables and OpenAI setup
 load_dotenv()
@@ -16,8 +42,96 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY not found.")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-app = FastAPI()
+# Shared HTTP connection pool for every OpenAI call (tunable per deployment)
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+
+# Per-stage timeouts in seconds
+EXPANSION_TIMEOUT = float(os.getenv("EXPANSION_TIMEOUT", "20"))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+VERIFICATION_TIMEOUT = float(os.getenv("VERIFICATION_TIMEOUT", "20"))
+
+# The OpenAI SDK (and httpx under it) is the heaviest import the app can defer, so it is
+# imported and the client built in the background once the server is listening (see lifespan)
+openai = None
+client = None
+UPSTREAM_TIMEOUT_ERRORS = (DeadlineExceeded,)
+
+def create_openai_client():
+    global openai, client, UPSTREAM_TIMEOUT_ERRORS
+    import httpx
+    import openai as sdk
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(max(EXPANSION_TIMEOUT, VERIFICATION_TIMEOUT), connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    UPSTREAM_TIMEOUT_ERRORS = (sdk.APITimeoutError, DeadlineExceeded)
+    openai = sdk
+    client = sdk.AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client)
+
+def is_upstream_failure(e):
+    # A request the API rejects says nothing about upstream health
+    return not (openai is not None and isinstance(e, openai.BadRequestError))
+
+# Upstream guards: bounded concurrency with queue-depth load shedding, a deadline per
+# stage (queueing included), hedging past the observed p95 and a circuit breaker
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "1") == "1"
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+def make_guard(stage, concurrency, deadline):
+    return UpstreamGuard(
+        stage,
+        max_concurrency=concurrency,
+        max_queue=UPSTREAM_MAX_QUEUE,
+        deadline=deadline,
+        hedge=HEDGE_REQUESTS,
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_SECONDS,
+        is_failure=is_upstream_failure,
+    )
+
+EXPANSION_GUARD = make_guard(
+    "expansion", int(os.getenv("EXPANSION_CONCURRENCY", "32")), float(os.getenv("EXPANSION_DEADLINE", str(EXPANSION_TIMEOUT)))
+)
+EMBEDDING_GUARD = make_guard(
+    "embedding", int(os.getenv("EMBEDDING_CONCURRENCY", "16")), float(os.getenv("EMBEDDING_DEADLINE", str(EMBEDDING_TIMEOUT)))
+)
+VERIFICATION_GUARD = make_guard(
+    "verification", int(os.getenv("VERIFICATION_CONCURRENCY", "32")),
+    float(os.getenv("VERIFICATION_DEADLINE", str(VERIFICATION_TIMEOUT))),
+)
+UPSTREAM_GUARDS = [EXPANSION_GUARD, EMBEDDING_GUARD, VERIFICATION_GUARD]
+
+# Chat-stage failures that switch a request to its degraded path instead of failing it;
+# shed requests (Overloaded) are answered from the cache or with a 503 instead
+CHAT_FALLBACK_ERRORS = (CircuitOpen, DeadlineExceeded)
+# The pipelined search also falls back when step 1 is shed: the raw input is
+# already being searched, so the degraded answer costs no extra upstream call
+PIPELINED_FALLBACK_ERRORS = (Overloaded, *CHAT_FALLBACK_ERRORS)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Nothing slow happens here: uvicorn starts accepting connections as soon as
+    # this yields, and /health/ready reports 503 until the background warm-up is done
+    STARTUP.mark("listening", since_process_start())
+    print(f"🚀 Accepting connections ({IMPORT_SECONDS * 1000:.0f} ms to import the app); warming up in the background.")
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+    yield
+    for task_name in ("warm_up_task", "prewarm_task", "watch_task"):
+        if getattr(app.state, task_name, None) is not None:
+            getattr(app.state, task_name).cancel()
+    if client is not None:
+        await client.close()
+    EMBEDDING_CACHE.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware (Important!)
 app.add_middleware(
@@ -26,152 +140,1043 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+class ObserveRequests:
+    """Request latency and in-flight metrics plus the Server-Timing header.
+
+    A plain ASGI middleware, so the request is only counted as finished once
+    the last body chunk is sent; a StreamingResponse hands over its headers
+    long before that. Streamed bodies get no Server-Timing header, since it
+    goes out before their stages have run.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+        # Unknown paths share one label so scanners cannot blow up metric cardinality
+        path = scope["path"] if scope["path"] in {route.path for route in app.routes} else "other"
+        timings = start_request_timings()
+        start = time.perf_counter()
+        held = None
+        status = 500
+
+        async def observed_send(message):
+            nonlocal held, status
+            if message["type"] == "http.response.start":
+                # Held back until the first body chunk shows whether the body is complete
+                held, status = message, message["status"]
+                return
+            if held is not None:
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    header = server_timing_header(timings, time.perf_counter() - start)
+                    held = {**held, "headers": [*held.get("headers", []), (b"server-timing", header.encode("latin-1"))]}
+                start_message, held = held, None
+                await send(start_message)
+            await send(message)
+
+        IN_FLIGHT.inc(path=path)
+        try:
+            await self.app(scope, receive, observed_send)
+        finally:
+            IN_FLIGHT.dec(path=path)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, path=path, method=scope["method"], status=status)
+
+app.add_middleware(ObserveRequests)
+
 # 2. Load keyword database (cache)
+# The mmap'd keyword store is preferred; the legacy pickle is still accepted
+STORE_FILE = os.getenv("KEYWORD_STORE_FILE", STORE_FILE)
 CACHE_FILE = "keyword_cache.pkl"
-try:
-    with open(CACHE_FILE, "rb") as f:
-        cache = pickle.load(f)
-        ALL_KEYWORDS = cache["keywords"]
-        KEYWORD_VECTORS = cache["vectors"]
-    print(f"✅ DB loaded successfully: {len(ALL_KEYWORDS)} keywords ready.")
-except Exception as e:
-    print(f"❌ Cache loading failed: {e}")
-    ALL_KEYWORDS = []
-    KEYWORD_VECTORS = np.array([])
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Lexical fast path: expanded keywords that (nearly) match a DB keyword reuse its vector
+LEXICAL_FUZZY = os.getenv("LEXICAL_FUZZY", "1") == "1"
+LEXICAL_FUZZY_THRESHOLD = float(os.getenv("LEXICAL_FUZZY_THRESHOLD", "0.85"))
+
+# Approximate search is only used for large databases; small ones are scanned exactly
+ANN_MIN_KEYWORDS = int(os.getenv("ANN_MIN_KEYWORDS", "50000"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+# Quantized stores (float16/int8) are scanned in compact form; the best
+# RESCORE_FACTOR * k hits are re-scored in float32 when the store keeps it.
+# This trades latency for memory: each scan decodes the matrix chunk by chunk,
+# several times slower than float32 (see quantize.py for the numbers)
+QUANTIZED_RESCORE = os.getenv("QUANTIZED_RESCORE", "1") == "1"
+RESCORE_FACTOR = int(os.getenv("RESCORE_FACTOR", "4"))
+
+def load_ann_index(n_keywords, version):
+    if n_keywords < ANN_MIN_KEYWORDS or not os.path.exists(ANN_FILE):
+        return None
+    ann = IVFIndex.load(ANN_FILE)
+    if ann.n_rows != n_keywords:
+        print(f"⚠️  ANN index covers {ann.n_rows} rows but DB has {n_keywords}; using exact search.")
+        return None
+    # Same row count is not enough: the lists hold row ids of the store they were built from
+    if ann.store_version and ann.store_version != version:
+        print(f"⚠️  ANN index was built for another keyword cache ({ann.store_version}); using exact search.")
+        return None
+    print(f"✅ ANN index loaded: {ann.n_lists} lists, nprobe={ANN_NPROBE}.")
+    return ann
+
+def load_movie_index(n_keywords, version):
+    if not os.path.exists(MOVIE_INDEX_FILE):
+        return None
+    movies = MovieIndex.load(MOVIE_INDEX_FILE)
+    if len(movies) != n_keywords or (movies.store_version and movies.store_version != version):
+        print(f"⚠️  Movie index was built for another keyword cache ({movies.store_version}); ignoring it.")
+        return None
+    print(f"✅ Movie index loaded: {movies.n_movies} movies, {len(movies.movie_ids)} keyword-movie pairs.")
+    return movies
+
+def load_snapshot(verify=False, progress=None):
+    """Load, validate and index the keyword DB; raises if the files are unusable.
+
+    `progress` (a StartupProgress) is told about each step while the server starts.
+    """
+    step = progress.step if progress is not None else lambda name: nullcontext()
+    start = time.perf_counter()
+    with step("keyword_store"):
+        keywords, vectors, compact, rescore, normalized, version, source, signature = read_keyword_db(verify)
+
+    if len(keywords) == 0:
+        raise ValueError("keyword DB is empty")
+    if len(vectors.shape) != 2 or vectors.shape[0] != len(keywords):
+        raise ValueError(f"{len(keywords)} keywords but vectors shaped {vectors.shape}")
+    # Query embeddings keep their dimension, so a reload must not change it
+    current = SNAPSHOT
+    if current is not None and vectors.shape[1] != current.index.dim:
+        raise ValueError(f"vector dim {vectors.shape[1]} does not match the active {current.index.dim}")
+
+    with step("keyword_index"):
+        ann = load_ann_index(len(keywords), version)
+        index = KeywordIndex(
+            keywords,
+            vectors,
+            ann=ann,
+            nprobe=ANN_NPROBE,
+            normalized=normalized,
+            compact=compact,
+            rescore=rescore,
+            rescore_factor=RESCORE_FACTOR,
+        )
+        _, scores = index.top_k(index.vectors[:1], 1)
+        if not np.isfinite(scores).all():
+            raise ValueError("smoke query against the new index returned no result")
+        movies = load_movie_index(len(keywords), version)
+    # Side indexes change results too, and a rebuilt one must count as a new
+    # version on reload even when the keyword store itself is unchanged
+    if ann is not None:
+        version += f"+ivf-{file_tag(signature[2])}"
+    if movies is not None:
+        version += f"+movies-{file_tag(signature[3])}"
+    with step("lexical_index"):
+        lexical = LexicalIndex(keywords, fuzzy_threshold=LEXICAL_FUZZY_THRESHOLD, fuzzy=LEXICAL_FUZZY)
+    return CacheSnapshot(index, lexical, version, source, signature, time.perf_counter() - start, movies)
+
+def read_keyword_db(verify):
+    signature = file_signature([STORE_FILE, CACHE_FILE, ANN_FILE, MOVIE_INDEX_FILE])
+    if os.path.exists(STORE_FILE):
+        store = open_store(STORE_FILE, verify=verify)
+        if store.header["model"] != EMBEDDING_MODEL:
+            print(f"⚠️  Keyword store was embedded with {store.header['model']}, queries use {EMBEDDING_MODEL}.")
+        keywords, vectors, compact = store.keywords, store.vectors, store.compact
+        rescore = QUANTIZED_RESCORE and store.full_precision
+        normalized = store.header["normalized"]
+        version = store.version
+        source = STORE_FILE
+    else:
+        with open(CACHE_FILE, "rb") as f:
+            cache = pickle.load(f)
+            keywords = cache["keywords"]
+            vectors = np.asarray(cache["vectors"], dtype=np.float32)
+        compact, rescore = None, False
+        if verify and not np.isfinite(vectors).all():
+            raise ValueError(f"{CACHE_FILE} contains non-finite vectors")
+        normalized = False
+        version = f"pkl-{int(os.path.getmtime(CACHE_FILE))}"
+        source = CACHE_FILE
+    return keywords, vectors, compact, rescore, normalized, version, source, signature
+
+# The active snapshot; loaded in the background at startup (see warm_up) and
+# replaced (never mutated) by reload_keyword_cache()
+SNAPSHOT = None
+STARTUP = StartupProgress(["openai_client", "tokenizer", "keyword_store", "keyword_index", "lexical_index"])
+
+def since_process_start():
+    age = process_age()
+    return age if age is not None else time.perf_counter() - IMPORT_STARTED
+
+def is_ready():
+    return SNAPSHOT is not None and len(SNAPSHOT) > 0 and client is not None
+
+def require_snapshot():
+    snapshot = SNAPSHOT
+    if is_ready():
+        return snapshot
+    if not STARTUP.finished:
+        raise HTTPException(status_code=503, detail="Server is starting up, please retry",
+                            headers={"Retry-After": "1"})
+    raise HTTPException(status_code=500, detail="Server keyword database is empty.")
+
+# Retrieval settings: top-k per expanded keyword and minimum cosine similarity
+RETRIEVAL_TOP_K = 5
+SIMILARITY_THRESHOLD = 0.45
+
+# 3. Query embedding cache (in-process LRU, optional SQLite tier that survives restarts)
+EMBEDDING_CACHE = EmbeddingCache(
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "10000")),
+    db_path=os.getenv("EMBEDDING_CACHE_DB") or None,
+)
+
+# Upper bound on inputs per embeddings.create call (API limit)
+EMBEDDING_BATCH_SIZE = 2048
+
+async def fetch_embeddings(texts):
+    chunks = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+    responses = await asyncio.gather(*[
+        EMBEDDING_GUARD.call(
+            lambda chunk=chunk: client.embeddings.create(input=chunk, model=EMBEDDING_MODEL, timeout=EMBEDDING_TIMEOUT)
+        )
+        for chunk in chunks
+    ])
+    for response in responses:
+        record_usage("embedding", response.usage)
+    return [d.embedding for response in responses for d in response.data]
+
+# Micro-batching: embedding misses and similarity searches from concurrent requests
+# arriving within the same short window share one upstream call / one matmul
+MICROBATCH_WINDOW = float(os.getenv("MICROBATCH_WINDOW_MS", "5")) / 1000
+
+async def search_rows(items):
+    # Items are (snapshot, query row); rows are searched against their own snapshot
+    # so a reload inside the batching window never mixes cache versions
+    groups = {}
+    for position, (snapshot, _) in enumerate(items):
+        groups.setdefault(id(snapshot), (snapshot, []))[1].append(position)
+    results = [None] * len(items)
+    for snapshot, positions in groups.values():
+        # A full scan (slower still when the store is quantized) must not stall the event loop
+        indices, scores = await asyncio.to_thread(
+            snapshot.index.top_k, np.vstack([items[p][1] for p in positions]), RETRIEVAL_TOP_K
+        )
+        for position, row_indices, row_scores in zip(positions, indices, scores):
+            results[position] = (row_indices, row_scores)
+    return results
+
+# A merged call the guard turned away (shed, open circuit, deadline) would fail
+# each request alike, so only other errors are retried request by request
+EMBEDDING_BATCHER = MicroBatcher(
+    fetch_embeddings,
+    window=MICROBATCH_WINDOW,
+    max_batch=int(os.getenv("EMBEDDING_MICROBATCH_MAX", str(EMBEDDING_BATCH_SIZE))),
+    split_on=lambda e: not isinstance(e, (Unavailable, DeadlineExceeded)),
+)
+SEARCH_BATCHER = MicroBatcher(
+    search_rows,
+    window=MICROBATCH_WINDOW,
+    max_batch=int(os.getenv("SEARCH_MICROBATCH_MAX", "512")),
+)
+
+# 4. End-to-end result cache, prewarmed at startup with the frontend's Quick Starter prompts
+RESULT_CACHE = ResultCache(
+    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1000")),
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+)
+DEFAULT_PREWARM_PROMPTS = [
+    "Something funny and upbeat",
+    "90s nostalgia",
+    "Intense love stories",
+    "Mind-bending thriller",
+    "Cozy rainy day movie",
+    "Epic adventure",
+    "Dark comedy",
+    "Feel-good family film"
+]
+# "|"-separated; set to an empty string to disable prewarming
+PREWARM_PROMPTS = [
+    p.strip() for p in os.getenv("PREWARM_PROMPTS", "|".join(DEFAULT_PREWARM_PROMPTS)).split("|") if p.strip()
+]
+
+# Step-3 ranking: "llm" always verifies with gpt-4o, "local" always uses the local
+# reranker, "auto" goes local when the candidate set is small or high-confidence
+RERANK_DEFAULT_MODE = os.getenv("RERANK_DEFAULT_MODE", "auto")
+RERANK_AUTO_MAX_CANDIDATES = int(os.getenv("RERANK_AUTO_MAX_CANDIDATES", "5"))
+RERANK_AUTO_MIN_SCORE = float(os.getenv("RERANK_AUTO_MIN_SCORE", "0.9"))
+RERANK_MAX_RESULTS = 8
+
+def result_version(snapshot, mode=None):
+    # Results depend on the keyword DB and on how step 3 was allowed to rank them
+    return (snapshot.version, mode or RERANK_DEFAULT_MODE)
+
+# Concurrent identical requests share one pipeline execution
+PIPELINE_FLIGHTS = SingleFlight()
+
+async def cached_pipeline(snapshot, user_input, mode=None):
+    async def execute():
+        result = await run_pipeline(snapshot, user_input, mode)
+        # Degraded answers are served but not cached, so recovery is picked up at once
+        if not result.get("degraded"):
+            RESULT_CACHE.put(user_input, result_version(snapshot, mode), result)
+        return result
+
+    return await PIPELINE_FLIGHTS.do((normalize_text(user_input), result_version(snapshot, mode)), execute)
+
+async def prewarm_result_cache():
+    snapshot = SNAPSHOT
+    for prompt in PREWARM_PROMPTS:
+        try:
+            await cached_pipeline(snapshot, prompt)
+        except Exception as e:
+            print(f"⚠️  Prewarm failed for '{prompt}': {e}")
+    print(f"✅ Result cache prewarmed: {RESULT_CACHE.stats()['entries']} entries.")
+
+def start_prewarm_task():
+    if SNAPSHOT is None or not PREWARM_PROMPTS:
+        return
+    if getattr(app.state, "prewarm_task", None) is not None:
+        app.state.prewarm_task.cancel()
+    app.state.prewarm_task = asyncio.create_task(prewarm_result_cache())
+
+# 5. Hot reload: a new cache version is loaded and validated off the event loop,
+# then swapped in with a single assignment; in-flight requests keep the old snapshot
+CACHE_WATCH_INTERVAL = float(os.getenv("CACHE_WATCH_INTERVAL", "0"))  # seconds, 0 disables
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+RELOAD_LOCK = asyncio.Lock()
+
+async def reload_keyword_cache(reason):
+    """Load the cache files into a new snapshot and make it active; returns (snapshot, changed)."""
+    global SNAPSHOT
+    async with RELOAD_LOCK:
+        previous = SNAPSHOT
+        try:
+            snapshot = await asyncio.to_thread(load_snapshot, True)
+        except Exception as e:
+            CACHE_RELOADS.inc(result="failed")
+            print(f"❌ Cache reload ({reason}) failed, keeping {previous.version if previous else 'no cache'}: {e}")
+            raise
+        if previous is not None and snapshot.version == previous.version:
+            # Same data; keep the old snapshot (and its warm state) but remember the files
+            previous.signature = snapshot.signature
+            CACHE_RELOADS.inc(result="unchanged")
+            return previous, False
+        SNAPSHOT = snapshot
+        CACHE_RELOADS.inc(result="swapped")
+        print(f"✅ Cache reloaded ({reason}): {len(snapshot)} keywords, version {snapshot.version} "
+              f"in {snapshot.load_seconds:.2f}s.")
+    start_prewarm_task()
+    return snapshot, True
+
+async def watch_keyword_cache():
+    failed_signature = None
+    while True:
+        await asyncio.sleep(CACHE_WATCH_INTERVAL)
+        signature = file_signature([STORE_FILE, CACHE_FILE, ANN_FILE, MOVIE_INDEX_FILE])
+        active = SNAPSHOT.signature if SNAPSHOT is not None else None
+        if signature in (active, failed_signature):
+            continue
+        try:
+            await reload_keyword_cache("file change")
+            failed_signature = None
+        except Exception:
+            # Retry only once the files change again (e.g. a copy that was still in progress)
+            failed_signature = signature
+
+def load_openai_client():
+    try:
+        with STARTUP.step("openai_client"):
+            create_openai_client()
+    except Exception as e:
+        print(f"❌ OpenAI client setup failed: {e}")
+
+def load_tokenizer():
+    try:
+        with STARTUP.step("tokenizer"):
+            load_encoding()
+    except Exception as e:
+        # Prompt token counts are estimated until a background retry succeeds (see prompts.count_tokens)
+        print(f"⚠️  tiktoken encoding unavailable ({e}); estimating tokens from length.")
+
+async def load_keyword_cache():
+    global SNAPSHOT
+    async with RELOAD_LOCK:
+        try:
+            SNAPSHOT = await asyncio.to_thread(load_snapshot, False, STARTUP)
+            print(f"✅ DB loaded successfully: {len(SNAPSHOT)} keywords ready.")
+        except Exception as e:
+            print(f"❌ Cache loading failed: {e}")
+            # Terminal until a reload succeeds: readiness reports "failed" and requests get a 500
+            STARTUP.skip_pending(f"cache loading failed: {e}")
+
+async def warm_up():
+    """Build the OpenAI client, load the tokenizer and the keyword cache side by side, off the event loop."""
+    await asyncio.gather(asyncio.to_thread(load_openai_client), asyncio.to_thread(load_tokenizer), load_keyword_cache())
+    if is_ready():
+        STARTUP.mark("ready", since_process_start())
+        print(f"🚀 Ready {STARTUP.milestones['ready']:.2f}s after process start "
+              f"(listening after {STARTUP.milestones['listening']:.2f}s).")
+        start_prewarm_task()
+    if CACHE_WATCH_INTERVAL > 0:
+        app.state.watch_task = asyncio.create_task(watch_keyword_cache())
 
 class RecommendRequest(BaseModel):
     user_input: str
+    mode: Optional[Literal["auto", "llm", "local"]] = None
+
+    @field_validator("user_input")
+    @classmethod
+    def not_blank(cls, value):
+        # The raw input is embedded as-is, and the embeddings API rejects empty text
+        if not value.strip():
+            raise ValueError("user_input must not be empty")
+        return value
+
+class BatchRecommendRequest(BaseModel):
+    user_inputs: list[str]
 
 @app.get("/")
 async def root():
     return {"message": "CineMatch Backend API is running!"}
 
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Liveness: the process is up and serving; never depends on the cache or OpenAI
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+# Readiness: 503 until the keyword cache and OpenAI client are loaded, with progress
+@app.get("/health/ready")
+async def readiness():
+    ready = is_ready()
+    body = {"status": "ready" if ready else "loading" if not STARTUP.finished else "failed", **STARTUP.report()}
+    if not ready:
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "1"})
+    return body
+
 @app.get("/health")
 async def health_check():
+    snapshot = SNAPSHOT
+    open_circuits = [guard.name for guard in UPSTREAM_GUARDS if guard.breaker.state != "closed"]
     return {
-        "status": "healthy",
-        "keywords_loaded": len(ALL_KEYWORDS),
-        "openai_configured": bool(OPENAI_API_KEY)
+        "status": "starting" if not is_ready() else "degraded" if open_circuits else "healthy",
+        "startup": STARTUP.report(),
+        "keywords_loaded": len(snapshot) if snapshot is not None else 0,
+        "openai_configured": bool(OPENAI_API_KEY),
+        "cache_version": snapshot.version if snapshot is not None else None,
+        "keyword_cache": snapshot.stats() if snapshot is not None else None,
+        "cache_watch_interval": CACHE_WATCH_INTERVAL,
+        "embedding_cache": EMBEDDING_CACHE.stats(),
+        "result_cache": RESULT_CACHE.stats(),
+        "pipeline_coalescing": PIPELINE_FLIGHTS.stats(),
+        "embedding_microbatch": EMBEDDING_BATCHER.stats(),
+        "search_microbatch": SEARCH_BATCHER.stats(),
+        "upstream": {guard.name: guard.stats() for guard in UPSTREAM_GUARDS}
     }
 
-@app.post("/recommend")
-async def recommend_movies(request: RecommendRequest):
-    if not ALL_KEYWORDS or KEYWORD_VECTORS.size == 0:
-        raise HTTPException(status_code=500, detail="Server keyword database is empty.")
+@app.post("/admin/reload-cache")
+async def admin_reload_cache(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (set ADMIN_TOKEN).")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    try:
+        snapshot, changed = await reload_keyword_cache("admin")
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Cache reload failed, previous version kept: {e}")
+    return {"status": "reloaded" if changed else "unchanged", **snapshot.stats()}
+
+# Token budget for the candidate list in the step-3 prompt; lowest-scored candidates are dropped first
+CANDIDATE_TOKEN_BUDGET = int(os.getenv("CANDIDATE_TOKEN_BUDGET", "400"))
+
+def counted(stage, messages):
+    PROMPT_TOKENS.observe(message_tokens(messages), stage=stage)
+    return messages
+
+def split_keywords(text):
+    return [k.strip() for k in text.split(",") if k.strip()]
 
+# --- Step 1: Intent Expansion with Core Preservation ---
+async def expand_intent(user_input):
+    with stage_timer("expansion"):
+        messages = counted("expansion", expansion_messages(user_input))
+        response_1 = await EXPANSION_GUARD.call(lambda: client.chat.completions.create(
+            model="gpt-4o",
+            timeout=EXPANSION_TIMEOUT,
+            messages=messages
+        ))
+    record_usage("expansion", response_1.usage)
+    # print(f"\n🔍 Step 1 - Expanded Keywords:")
+    # print(f"\n{response_1.choices[0].message.content}")
+    return split_keywords(response_1.choices[0].message.content)
+
+async def expand_or_fallback(user_input):
+    """Return (keywords, degraded); the raw input is searched as-is when step 1 is unavailable."""
     try:
-        # print(f"\n{'='*60}")
-        # print(f"📥 NEW QUERY: {request.user_input}")
-        # print(f"{'='*60}")
-        
-        # --- Step 1: Intent Expansion with Core Preservation ---
-        prompt_1 = f"""
-        User Input: "{request.user_input}"
-        
-        Task: Expand the user's input into 10 specific cinematic keywords while PRESERVING core concepts.
-        
-        CRITICAL RULES:
-        1. IDENTIFY CORE KEYWORDS: Extract the main nouns, genres, or themes from the user's input (e.g., "family", "love", "thriller", "90s")
-        2. PRESERVE CORE KEYWORDS: If the user explicitly mentions "family", "romance", "horror", etc., AT LEAST 50% of your output must include or directly relate to that core concept
-        3. EXPAND APPROPRIATELY: Add related emotional tones, sub-genres, or narrative elements that ENHANCE the core concept, not replace it
-        4. USE PROFESSIONAL TERMINOLOGY: Convert casual language to film industry terms (e.g., "sad" → "Melancholic", "funny" → "Comedic")
-        5. MEDIA TYPE PRESERVATION: If the user asks for a "Movie", focus ONLY on film-related terms. Avoid TV-related terms like "Drama", "Series", or "K-Drama" unless the user explicitly asked for them.
-        
-        Examples:
-        - Input: "Feel-good family film" → Output must include: "Family", "Family-friendly", "Family bonding", "Wholesome", "All-ages", etc.
-        - Input: "Intense love stories" → Output must include: "Romance", "Romantic", "Love", "Passionate", "Star-crossed", etc.
-        - Input: "90s nostalgia" → Output must include: "90s", "1990s", "Nostalgia", "Retro", etc.
-        
-        Output ONLY 10 keywords/phrases separated by commas. Ensure the core concept is clearly maintained.
-        """
-        
-        response_1 = client.chat.completions.create(
+        return await expand_intent(user_input), False
+    except CHAT_FALLBACK_ERRORS as e:
+        print(f"⚠️  Expansion unavailable ({e}); searching with the raw input.")
+        return [user_input.strip()], True
+
+async def stream_expansion(user_input):
+    """Yield the step-1 keywords one at a time, each as soon as its trailing comma arrives."""
+    with stage_timer("expansion"):
+        messages = counted("expansion", expansion_messages(user_input))
+        # Guarded for the whole stream: the deadline and the concurrency slot
+        # cover every chunk, and an error partway through trips the breaker
+        stream = EXPANSION_GUARD.stream(lambda: client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a film keyword specialist. Your primary job is to PRESERVE the user's core intent while expanding it with relevant professional terminology. Never lose the main concept."},
-                {"role": "user", "content": prompt_1}
-            ]
+            timeout=EXPANSION_TIMEOUT,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        pending = ""
+        async with aclosing(stream):
+            async for chunk in stream:
+                record_usage("expansion", chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    *complete, pending = (pending + chunk.choices[0].delta.content).split(",")
+                    for keyword in complete:
+                        if keyword.strip():
+                            yield keyword.strip()
+        if pending.strip():
+            yield pending.strip()
+
+# --- Step 2: Broad Semantic Retrieval ---
+async def embed_keywords(snapshot, keywords):
+    """Return (query vectors, embedded mask) for `keywords`.
+
+    Lexical matches reuse DB vectors (mask False), the rest are embedded.
+    """
+    query_vectors = np.empty((len(keywords), snapshot.index.dim), dtype=np.float32)
+    embedded = np.ones(len(keywords), dtype=bool)
+    leftover = []
+    for i, keyword in enumerate(keywords):
+        match = snapshot.lexical.lookup(keyword)
+        if match is None:
+            leftover.append(i)
+            LEXICAL_LOOKUPS.inc(result="miss")
+        else:
+            query_vectors[i] = snapshot.vectors[match[0]]
+            embedded[i] = False
+            LEXICAL_LOOKUPS.inc(result="exact" if match[1] == 1.0 else "fuzzy")
+    if leftover:
+        query_vectors[leftover] = await EMBEDDING_CACHE.embed(
+            EMBEDDING_MODEL, [keywords[i] for i in leftover], EMBEDDING_BATCHER.submit
         )
-        llm_expanded_keywords = [k.strip() for k in response_1.choices[0].message.content.split(",") if k.strip()]
-        
-        # print(f"\n🔍 Step 1 - Expanded Keywords:")
-        # print(f"\n{response_1.choices[0].message.content}")
-
-        # --- Step 2: Broad Semantic Retrieval ---
-        query_resp = client.embeddings.create(input=llm_expanded_keywords, model="text-embedding-3-small")
-        query_vectors = np.array([d.embedding for d in query_resp.data]).astype('float32')
-        
-        similarities = cosine_similarity(query_vectors, KEYWORD_VECTORS)
-        
-        candidates = set()
-        for row in similarities:
-            top_indices = row.argsort()[-5:][::-1]
-            for idx in top_indices:
-                if row[idx] >= 0.45:
-                    candidates.add(ALL_KEYWORDS[idx])
-        
-        candidate_list = list(candidates)
-        
-        # print(f"\n🎯 Step 2 - Database Candidates Found: {len(candidate_list)}")
-        # print(f"  {', '.join(sorted(candidate_list))}")
-        
-        if not candidate_list:
-            print(f"\n⚠️  No candidates found in database")
-            return {"recommended_keywords": [], "llm_generated_keywords": llm_expanded_keywords}
-
-        # --- Step 3: Context-Aware Filtering & Combination ---
-        verification_prompt = f"""
-        User's Original Intent: "{request.user_input}"
-        Database Candidates: {", ".join(candidate_list)}
-
-        CRITICAL RULE: 
-        - A keyword is valid ONLY if it covers the ENTIRE intent. 
-        - If a candidate from the list only covers partially, you ARE FORBIDDEN from using it alone. You MUST combine it with another candidate using a '+' sign.
-        - If the user specifies a media type (e.g., Movie or TV Series), you MUST NOT use keywords that are exclusive to the other format.
-
-        Task:
-        1. DECONSTRUCT INTENT: Break down the user's intent into its essential components.
-        2. INTERSECTION PRINCIPLE: Every output keyword must represent the INTERSECTION of all essential components.
-        3. COMBINATION LOGIC:
-           - If a single keyword in 'Database Candidates' already captures the full intersection, use it.
-           - Otherwise, you MUST create a combined term by joining a keyword for Component A and a keyword for Component B from the 'Database Candidates' using a ' + ' sign.
-           - Combine only up to 2 keywords, not more than that.
-        4. ANTI-GENERALIZATION RULE: 
-           - DO NOT return a keyword that only covers part of the intent. 
-        5. SOURCE INTEGRITY: Use ONLY exact strings from 'Database Candidates'. Do not shorten or modify them except for joining with ' + '.
-        6. SELECTION: Return 5-8 most relevant, high-precision keywords/combinations.
-        7. FILTERING: Remove any candidate that is out of user's intent or is irrelevant.
-        8. RANKING RULE: List the keywords in order of relevance to the "{request.user_input}".
-
-        CRITICAL OUTPUT RULES:
-        - Output ONLY the keywords separated by commas.
-        - **DO NOT include any labels, core context, intros, or outros.**
-        """
-        
-        verify_response = client.chat.completions.create(
+    return query_vectors, embedded
+
+def merge_rows(snapshot, indices, scores, embedded):
+    """Return (candidate ids, scores, embedded scores), best first.
+
+    Embedded scores come from embedded query rows only: a lexical match is its
+    own DB vector and scores ~1.0 against itself, which says nothing about
+    how confident the search is.
+    """
+    ids, best = snapshot.index.merge_ids(indices, scores, threshold=SIMILARITY_THRESHOLD)
+    _, embedded_best = snapshot.index.merge_ids(indices[embedded], scores[embedded], threshold=SIMILARITY_THRESHOLD)
+    CANDIDATES.observe(len(ids))
+    return ids, best, embedded_best
+
+async def search_candidates(snapshot, keywords):
+    """Return (query vectors, candidate keyword ids, scores, embedded scores), best first."""
+    with stage_timer("embedding"):
+        query_vectors, embedded = await embed_keywords(snapshot, keywords)
+    with stage_timer("similarity"):
+        rows = await SEARCH_BATCHER.submit([(snapshot, row) for row in query_vectors])
+        indices = np.vstack([i for i, _ in rows])
+        scores = np.vstack([s for _, s in rows])
+        return (query_vectors, *merge_rows(snapshot, indices, scores, embedded))
+
+# Pipelined steps 1-2: each expanded keyword is embedded and searched while gpt-4o
+# is still generating the next one, and the raw input is searched speculatively
+PIPELINED_EXPANSION = os.getenv("PIPELINED_EXPANSION", "1") == "1"
+
+async def search_keyword(snapshot, keyword):
+    """Return (query vector, top-k ids, top-k scores, embedded) for one keyword."""
+    with stage_timer("embedding"):
+        vectors, embedded = await embed_keywords(snapshot, [keyword])
+    with stage_timer("similarity"):
+        (indices, scores), = await SEARCH_BATCHER.submit([(snapshot, vectors[0])])
+    return vectors[0], indices, scores, embedded[0]
+
+def start_search(snapshot, keyword):
+    task = asyncio.ensure_future(search_keyword(snapshot, keyword))
+    task.add_done_callback(consume_exception)
+    return task
+
+async def pipelined_search(snapshot, user_input):
+    """Steps 1 and 2 overlapped.
+
+    Yields ("keyword", keyword) for each expanded keyword as it streams in, then
+    ("searched", (keywords, degraded, query vectors, candidate ids, scores, embedded scores)).
+    The raw input is one of the queries, so it also covers a failed step 1.
+    """
+    raw_search = start_search(snapshot, user_input.strip())
+    searches = []
+    try:
+        keywords, degraded = [], False
+        try:
+            async with aclosing(stream_expansion(user_input)) as expansion:
+                async for keyword in expansion:
+                    keywords.append(keyword)
+                    searches.append(start_search(snapshot, keyword))
+                    yield "keyword", keyword
+        except PIPELINED_FALLBACK_ERRORS as e:
+            print(f"⚠️  Expansion unavailable ({e}); searching with the raw input.")
+            for task in searches:
+                task.cancel()
+            keywords, degraded, searches = [user_input.strip()], True, []
+
+        rows = list(await asyncio.gather(*searches))
+        try:
+            rows.insert(0, await raw_search)
+        except Exception as e:
+            # Speculative only: the expanded keywords are enough on their own
+            if not rows:
+                raise
+            print(f"⚠️  Raw input search failed ({e}); using the expanded keywords only.")
+        vectors, indices, scores, embedded = zip(*rows)
+        yield "searched", (keywords, degraded, np.vstack(vectors),
+                           *merge_rows(snapshot, np.vstack(indices), np.vstack(scores), np.array(embedded)))
+    finally:
+        for task in (raw_search, *searches):
+            task.cancel()
+
+async def expand_and_search(snapshot, user_input):
+    """Steps 1 and 2; return (keywords, degraded, query vectors, candidate ids, scores, embedded scores)."""
+    if PIPELINED_EXPANSION:
+        async with aclosing(pipelined_search(snapshot, user_input)) as events:
+            async for event, value in events:
+                if event == "searched":
+                    return value
+    keywords, degraded = await expand_or_fallback(user_input)
+    return (keywords, degraded, *await search_candidates(snapshot, keywords))
+
+# --- Step 2b: Movie co-occurrence (keyword→movie inverted index) ---
+# Candidates no movie is tagged with are dropped, and "A + B" pairs are only
+# offered to (and accepted from) step 3 when they share at least one movie
+COMBINATION_TOKEN_BUDGET = int(os.getenv("COMBINATION_TOKEN_BUDGET", "200"))
+
+def match_movies(snapshot, ids, scores):
+    """Return (ids, scores, pair counts) without zero-movie candidates; pair counts is None without an index."""
+    if snapshot.movies is None or len(ids) == 0:
+        return ids, scores, None
+    with stage_timer("cooccurrence"):
+        pair_counts = snapshot.movies.pair_counts(ids)
+        keep = np.diag(pair_counts) > 0
+    return ids[keep], scores[keep], pair_counts[np.ix_(keep, keep)]
+
+def valid_combinations(candidate_list, pair_counts):
+    """"A + B" for every candidate pair that shares a movie, most shared movies first."""
+    if pair_counts is None:
+        return None
+    a, b = np.triu_indices(len(candidate_list), k=1)
+    shared = pair_counts[a, b]
+    order = np.argsort(-shared, kind="stable")
+    return [f"{candidate_list[a[i]]} + {candidate_list[b[i]]}" for i in order if shared[i] > 0]
+
+def count_matches(snapshot, labels, candidate_list, ids):
+    """Return (labels, {label: movies matched}); labels that match no movie are dropped.
+
+    Without a movie index the labels are returned as-is with None.
+    """
+    if snapshot.movies is None:
+        return labels, None
+    rows = dict(zip(candidate_list, ids))
+    kept, counts = [], {}
+    for label in labels:
+        parts = [rows.get(part.strip()) for part in label.split(" + ")]
+        if None in parts:
+            kept.append(label)  # not built from candidates; nothing to check it against
+            continue
+        count = len(snapshot.movies.shared(parts))
+        if count:
+            kept.append(label)
+            counts[label] = count
+    return kept, counts
+
+# --- Step 3: Context-Aware Filtering & Combination ---
+def verification_request(user_input, candidate_list, combinations=None):
+    candidate_list = fit_candidates(candidate_list, CANDIDATE_TOKEN_BUDGET)
+    if combinations is not None:
+        kept = set(candidate_list)
+        combinations = fit_candidates(
+            [c for c in combinations if all(part in kept for part in c.split(" + "))], COMBINATION_TOKEN_BUDGET
+        )
+    return counted("verification", verification_messages(user_input, candidate_list, combinations))
+
+async def verify_candidates(user_input, candidate_list, combinations=None):
+    with stage_timer("verification"):
+        messages = verification_request(user_input, candidate_list, combinations)
+        verify_response = await VERIFICATION_GUARD.call(lambda: client.chat.completions.create(
             model="gpt-4o",
-            messages=[ 
-                {"role": "system", "content": "You are a precision movie search filter. Your job is to eliminate ambiguous keywords that could apply to multiple genres when the user specified a specific context. to ensure the user's \"Primary Intent\" is preserved in every single keyword returned. Your response must be a single line of comma-separated strings."},
-                {"role": "user", "content": verification_prompt}
-            ]
+            timeout=VERIFICATION_TIMEOUT,
+            messages=messages
+        ))
+    record_usage("verification", verify_response.usage)
+    # print(f"\n✅ Step 3 - Final Recommended Keywords:")
+    # print(f"{verify_response.choices[0].message.content}")
+    return split_keywords(verify_response.choices[0].message.content)
+
+async def stream_verification(user_input, candidate_list, combinations=None):
+    """Yield the step-3 completion token by token."""
+    with stage_timer("verification"):
+        messages = verification_request(user_input, candidate_list, combinations)
+        # Guarded for the whole stream, like step 1
+        stream = VERIFICATION_GUARD.stream(lambda: client.chat.completions.create(
+            model="gpt-4o",
+            timeout=VERIFICATION_TIMEOUT,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True}
+        ))
+        async with aclosing(stream):
+            async for chunk in stream:
+                record_usage("verification", chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+# --- Step 3 fast path: local reranking ---
+async def embed_intent(user_input):
+    return (await EMBEDDING_CACHE.embed(EMBEDDING_MODEL, [user_input], EMBEDDING_BATCHER.submit))[0]
+
+def start_intent_embedding(user_input, mode):
+    """Embed the raw user input alongside step 1 when local reranking may be used."""
+    if (mode or RERANK_DEFAULT_MODE) == "llm":
+        return None
+    task = asyncio.ensure_future(embed_intent(user_input))
+    task.add_done_callback(consume_exception)
+    return task
+
+def choose_ranking(mode, scores, embedded_scores):
+    """`embedded_scores` (see merge_rows) decide confidence; lexical matches would always look certain."""
+    mode = mode or RERANK_DEFAULT_MODE
+    if mode != "auto":
+        return mode
+    if len(scores) <= RERANK_AUTO_MAX_CANDIDATES:
+        return "local"
+    if len(embedded_scores) >= 3 and embedded_scores[:3].min() >= RERANK_AUTO_MIN_SCORE:
+        return "local"
+    return "llm"
+
+async def rerank_candidates(snapshot, user_input, query_vectors, ids, intent_task, pair_counts=None):
+    with stage_timer("rerank"):
+        intent_vector = await (intent_task or embed_intent(user_input))
+        return rerank(
+            [snapshot.keywords[i] for i in ids],
+            snapshot.vectors[ids],
+            intent_vector,
+            query_vectors,
+            max_results=RERANK_MAX_RESULTS,
+            pair_counts=pair_counts,
         )
-        
-        final_keywords = [k.strip() for k in verify_response.choices[0].message.content.split(",") if k.strip()]
-        
-        # print(f"\n✅ Step 3 - Final Recommended Keywords:")
-        # print(f"{verify_response.choices[0].message.content}")
 
-        return {
-            "recommended_keywords": final_keywords,
-            "llm_generated_keywords": llm_expanded_keywords
-        }
+async def run_pipeline(snapshot, user_input, mode=None):
+    # print(f"\n{'='*60}")
+    # print(f"📥 NEW QUERY: {user_input}")
+    # print(f"{'='*60}")
+    intent_task = start_intent_embedding(user_input, mode)
+    try:
+        return await _run_pipeline(snapshot, user_input, mode, intent_task)
+    finally:
+        if intent_task is not None:
+            intent_task.cancel()
+
+async def _run_pipeline(snapshot, user_input, mode, intent_task):
+    llm_expanded_keywords, degraded, query_vectors, ids, scores, embedded_scores = await expand_and_search(
+        snapshot, user_input
+    )
+    ids, scores, pair_counts = match_movies(snapshot, ids, scores)
+    candidate_list = [snapshot.keywords[i] for i in ids]
+    
+    # print(f"\n🎯 Step 2 - Database Candidates Found: {len(candidate_list)}")
+    # print(f"  {', '.join(sorted(candidate_list))}")
+    
+    if not candidate_list:
+        print(f"\n⚠️  No candidates found in database")
+        return {"recommended_keywords": [], "llm_generated_keywords": llm_expanded_keywords}
+
+    ranking = choose_ranking(mode, scores, embedded_scores)
+    final_keywords = None
+    if ranking == "llm":
+        try:
+            final_keywords = await verify_candidates(
+                user_input, candidate_list, valid_combinations(candidate_list, pair_counts)
+            )
+        except CHAT_FALLBACK_ERRORS as e:
+            print(f"⚠️  Verification unavailable ({e}); ranking locally.")
+            ranking, degraded = "local", True
+    if final_keywords is None:
+        final_keywords = await rerank_candidates(snapshot, user_input, query_vectors, ids, intent_task, pair_counts)
+    final_keywords, match_counts = count_matches(snapshot, final_keywords, candidate_list, ids)
+
+    result = {
+        "recommended_keywords": final_keywords,
+        "llm_generated_keywords": llm_expanded_keywords,
+        "ranking": ranking
+    }
+    if match_counts is not None:
+        result["match_counts"] = match_counts
+    if degraded:
+        result["degraded"] = True
+    return result
+
+
+@app.post("/recommend")
+async def recommend_movies(request: RecommendRequest):
+    snapshot = require_snapshot()
 
+    cached = RESULT_CACHE.get(request.user_input, result_version(snapshot, request.mode))
+    if cached is not None:
+        return cached
+
+    try:
+        result = await cached_pipeline(snapshot, request.user_input, request.mode)
+    except Unavailable as e:
+        cached = cached_in_any_mode(snapshot, request.user_input)
+        if cached is not None:
+            return cached
+        print(f"\n🚦 UPSTREAM UNAVAILABLE: {e}\n")
+        raise HTTPException(status_code=503, detail="Upstream model is overloaded, please retry",
+                            headers={"Retry-After": str(e.retry_after)})
+    except UPSTREAM_TIMEOUT_ERRORS as e:
+        print(f"\n⏱️ UPSTREAM TIMEOUT: {e}\n")
+        raise HTTPException(status_code=504, detail="Upstream model timed out")
     except Exception as e:
         print(f"\n❌ ERROR: {e}\n")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    return result
+
+
+def cached_in_any_mode(snapshot, user_input):
+    for mode in ("llm", "auto", "local"):
+        cached = RESULT_CACHE.get(user_input, result_version(snapshot, mode))
+        if cached is not None:
+            return cached
+    return None
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_pipeline(snapshot, user_input, mode=None):
+    """Run the pipeline, emitting each stage's output as a server-sent event."""
+    cached = RESULT_CACHE.get(user_input, result_version(snapshot, mode))
+    if cached is not None:
+        yield sse_event("keywords", {"llm_generated_keywords": cached["llm_generated_keywords"]})
+        yield sse_event("result", cached)
+        return
+
+    intent_task = start_intent_embedding(user_input, mode)
+    try:
+        if PIPELINED_EXPANSION:
+            async with aclosing(pipelined_search(snapshot, user_input)) as events:
+                async for event, value in events:
+                    if event == "keyword":
+                        yield sse_event("keyword", {"keyword": value})
+            llm_expanded_keywords, degraded, query_vectors, ids, scores, embedded_scores = value
+            yield sse_event("keywords", {"llm_generated_keywords": llm_expanded_keywords})
+        else:
+            llm_expanded_keywords, degraded = await expand_or_fallback(user_input)
+            yield sse_event("keywords", {"llm_generated_keywords": llm_expanded_keywords})
+            query_vectors, ids, scores, embedded_scores = await search_candidates(snapshot, llm_expanded_keywords)
+        ids, scores, pair_counts = match_movies(snapshot, ids, scores)
+        candidate_list = [snapshot.keywords[i] for i in ids]
+        candidates = [{"keyword": k, "score": round(float(s), 4)} for k, s in zip(candidate_list, scores)]
+        if pair_counts is not None:
+            for candidate, count in zip(candidates, np.diag(pair_counts)):
+                candidate["movies"] = int(count)
+        yield sse_event("candidates", {"candidates": candidates})
+
+        final_keywords = []
+        ranking = choose_ranking(mode, scores, embedded_scores)
+        if candidate_list and ranking == "llm":
+            content = []
+            try:
+                combinations = valid_combinations(candidate_list, pair_counts)
+                async with aclosing(stream_verification(user_input, candidate_list, combinations)) as tokens:
+                    async for token in tokens:
+                        content.append(token)
+                        yield sse_event("token", {"text": token})
+                final_keywords = split_keywords("".join(content))
+            except CHAT_FALLBACK_ERRORS as e:
+                print(f"⚠️  Verification unavailable ({e}); ranking locally.")
+                ranking, degraded = "local", True
+        if candidate_list and ranking == "local":
+            final_keywords = await rerank_candidates(snapshot, user_input, query_vectors, ids, intent_task,
+                                                     pair_counts)
+        final_keywords, match_counts = count_matches(snapshot, final_keywords, candidate_list, ids)
+    except Unavailable as e:
+        print(f"\n🚦 UPSTREAM UNAVAILABLE: {e}\n")
+        yield sse_event("error", {"status": 503, "detail": "Upstream model is overloaded, please retry",
+                                  "retry_after": e.retry_after})
+        return
+    except UPSTREAM_TIMEOUT_ERRORS as e:
+        print(f"\n⏱️ UPSTREAM TIMEOUT: {e}\n")
+        yield sse_event("error", {"status": 504, "detail": "Upstream model timed out"})
+        return
+    except Exception as e:
+        print(f"\n❌ ERROR: {e}\n")
+        yield sse_event("error", {"status": 500, "detail": "Internal Server Error"})
+        return
+    finally:
+        if intent_task is not None:
+            intent_task.cancel()
+
+    result = {
+        "recommended_keywords": final_keywords,
+        "llm_generated_keywords": llm_expanded_keywords,
+        "ranking": ranking
+    }
+    if match_counts is not None:
+        result["match_counts"] = match_counts
+    if degraded:
+        result["degraded"] = True
+    else:
+        RESULT_CACHE.put(user_input, result_version(snapshot, mode), result)
+    yield sse_event("result", result)
+
+@app.post("/recommend/stream")
+async def recommend_movies_stream(request: RecommendRequest):
+    snapshot = require_snapshot()
+
+    return StreamingResponse(
+        stream_pipeline(snapshot, request.user_input, request.mode),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Batch settings: concurrent LLM calls per batch and inputs processed per chunk
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "256"))
+
+async def recommend_batch(user_inputs, concurrency=BATCH_CONCURRENCY, snapshot=None):
+    """Yield one result dict per input (with its "index"), in completion order.
+
+    Inputs are processed in chunks: step 1 runs with bounded concurrency, every
+    expanded keyword in the chunk is embedded together and scored with a single
+    matrix multiply (in a worker thread), then step 3 results are yielded as
+    they finish. Repeated inputs in a chunk run the pipeline once. The whole
+    batch uses one keyword cache snapshot, even if a reload happens meanwhile.
+    """
+    snapshot = snapshot or SNAPSHOT
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    async def expand(index, user_input):
+        try:
+            return index, await bounded(expand_intent(user_input)), None
+        except Exception as e:
+            return index, None, e
+
+    async def verify(index, user_input, keywords, ids, pair_counts):
+        try:
+            final_keywords = []
+            candidate_list = [snapshot.keywords[i] for i in ids]
+            if candidate_list:
+                final_keywords = await bounded(verify_candidates(
+                    user_input, candidate_list, valid_combinations(candidate_list, pair_counts)
+                ))
+            final_keywords, match_counts = count_matches(snapshot, final_keywords, candidate_list, ids)
+            result = {"recommended_keywords": final_keywords, "llm_generated_keywords": keywords, "ranking": "llm"}
+            if match_counts is not None:
+                result["match_counts"] = match_counts
+            RESULT_CACHE.put(user_input, result_version(snapshot, "llm"), result)
+            return {"index": index, "user_input": user_input, **result}
+        except Exception as e:
+            return {"index": index, "user_input": user_input, "error": str(e)}
+
+    for start in range(0, len(user_inputs), BATCH_CHUNK_SIZE):
+        chunk = list(enumerate(user_inputs[start:start + BATCH_CHUNK_SIZE], start))
+
+        # --- Step 1 (cached inputs skip the whole pipeline, repeats share one run) ---
+        pending = []
+        duplicates = {}
+        first_index = {}
+        for index, user_input in chunk:
+            cached = RESULT_CACHE.get(user_input, result_version(snapshot, "llm"))
+            if cached is not None:
+                yield {"index": index, "user_input": user_input, **cached}
+            elif normalize_text(user_input) in first_index:
+                duplicates[first_index[normalize_text(user_input)]].append(index)
+            else:
+                first_index[normalize_text(user_input)] = index
+                duplicates[index] = []
+                pending.append((index, user_input))
+
+        def with_duplicates(result):
+            yield result
+            for index in duplicates[result["index"]]:
+                yield {**result, "index": index, "user_input": user_inputs[index]}
+
+        expanded = {}
+        for index, keywords, error in await asyncio.gather(*[expand(i, u) for i, u in pending]):
+            if error is not None:
+                for result in with_duplicates({"index": index, "user_input": user_inputs[index], "error": str(error)}):
+                    yield result
+            elif keywords:
+                expanded[index] = keywords
+            else:
+                for result in with_duplicates({"index": index, "user_input": user_inputs[index],
+                                               "recommended_keywords": [], "llm_generated_keywords": []}):
+                    yield result
+        if not expanded:
+            continue
+
+        # --- Step 2: one embedding pass and one matmul for the whole chunk ---
+        all_keywords = [k for keywords in expanded.values() for k in keywords]
+        try:
+            with stage_timer("embedding"):
+                query_vectors, _ = await embed_keywords(snapshot, all_keywords)
+        except Exception as e:
+            for index in expanded:
+                for result in with_duplicates({"index": index, "user_input": user_inputs[index], "error": str(e)}):
+                    yield result
+            continue
+        with stage_timer("similarity"):
+            # Thousands of rows against the whole DB: keep the matmul off the event loop
+            indices, scores = await asyncio.to_thread(snapshot.index.top_k, query_vectors, RETRIEVAL_TOP_K)
+
+        # --- Step 3, streamed back as each verification completes ---
+        tasks = []
+        row = 0
+        for index, keywords in expanded.items():
+            rows = slice(row, row + len(keywords))
+            row += len(keywords)
+            ids, best = snapshot.index.merge_ids(indices[rows], scores[rows], SIMILARITY_THRESHOLD)
+            CANDIDATES.observe(len(ids))
+            ids, _, pair_counts = match_movies(snapshot, ids, best)
+            tasks.append(verify(index, user_inputs[index], keywords, ids, pair_counts))
+        for task in asyncio.as_completed(tasks):
+            for result in with_duplicates(await task):
+                yield result
+
+async def batch_lines(snapshot, user_inputs):
+    async for result in recommend_batch(user_inputs, snapshot=snapshot):
+        yield json.dumps(result) + "\n"
+
+@app.post("/recommend/batch")
+async def recommend_movies_batch(request: BatchRecommendRequest):
+    snapshot = require_snapshot()
+
+    return StreamingResponse(batch_lines(snapshot, request.user_inputs), media_type="application/x-ndjson")
+
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
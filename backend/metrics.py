@@ -0,0 +1,171 @@
+# backend/metrics.py
+"""Minimal Prometheus-style metrics (text exposition format 0.0.4) and per-request stage timing."""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 5, 10, 20, 30, 40, 50, 75, 100)
+TOKEN_BUCKETS = (100, 200, 300, 400, 500, 750, 1000, 1500, 2000, 4000)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs]
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value not in (float("inf"), float("-inf")) else ("+Inf" if value > 0 else "-Inf")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        base = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+        lines.append(f"{self.name}_count{base} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+
+def render_metrics():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram("recommend_stage_duration_seconds", "Latency of each recommendation pipeline stage.", ["stage"])
+STAGE_ERRORS = Counter("recommend_stage_errors_total", "Exceptions raised per pipeline stage.", ["stage", "error"])
+UPSTREAM_TOKENS = Counter("openai_tokens_total", "Tokens reported by OpenAI usage per stage.", ["stage", "kind"])
+CANDIDATES = Histogram("recommend_candidates", "Database candidates produced per request by step 2.", buckets=COUNT_BUCKETS)
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ["path", "method", "status"])
+PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Input tokens per LLM call, counted before sending.", ["stage"],
+                          buckets=TOKEN_BUCKETS)
+LEXICAL_LOOKUPS = Counter("lexical_lookups_total", "Expanded keywords resolved by the lexical index.", ["result"])
+UPSTREAM_EVENTS = Counter("upstream_guard_events_total",
+                          "Load shedding, deadline, failure, circuit breaker and hedging events per stage.",
+                          ["stage", "event"])
+CACHE_RELOADS = Counter("keyword_cache_reloads_total", "Keyword cache hot reload attempts by outcome.", ["result"])
+STARTUP_SECONDS = Gauge("startup_seconds", "Seconds from process start to each cold-start milestone.", ["milestone"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served.", ["path"])
+
+# Stage timings of the current request, surfaced as a Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings():
+    timings = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a pipeline stage into STAGE_SECONDS, STAGE_ERRORS and the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.inc(stage=stage, error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_usage(stage, usage):
+    """Add an OpenAI `usage` object's token counts to UPSTREAM_TOKENS."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            UPSTREAM_TOKENS.inc(value, stage=stage, kind=kind.replace("_tokens", ""))
+    # Prompt tokens served from the provider's prefix cache
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    if cached:
+        UPSTREAM_TOKENS.inc(cached, stage=stage, kind="cached_prompt")
+
+
+def server_timing_header(timings, total=None):
+    parts = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,83 @@
+# backend/microbatch.py
+import asyncio
+
+
+class MicroBatcher:
+    """Merge work submitted by concurrent requests into one call.
+
+    Items submitted within `window` seconds of the first pending item (or
+    until `max_batch` items are waiting) are passed together to the async
+    `process(items)` callable, which must return one result per item. Each
+    caller gets back the results for its own items.
+
+    If a merged call fails with an error `split_on` accepts, each caller's
+    items are retried on their own, so one bad input only fails the request
+    that sent it.
+    """
+
+    def __init__(self, process, window=0.005, max_batch=256, split_on=lambda e: True):
+        self.process = process
+        self.split_on = split_on
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._pending_items = 0
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+        self.splits = 0
+
+    async def submit(self, items):
+        items = list(items)
+        if self.window <= 0:
+            return await self._run(items)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((items, future))
+        self._pending_items += len(items)
+        if self._pending_items >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    async def _run(self, items):
+        self.batches += 1
+        self.items += len(items)
+        return list(await self.process(items))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_items = self._pending, [], 0
+        if pending:
+            asyncio.ensure_future(self._dispatch(pending))
+
+    async def _dispatch(self, pending):
+        try:
+            results = await self._run([item for items, _ in pending for item in items])
+        except Exception as e:
+            if len(pending) > 1 and self.split_on(e):
+                self.splits += 1
+                await asyncio.gather(*(self._dispatch([entry]) for entry in pending))
+                return
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for items, future in pending:
+            if not future.done():
+                future.set_result(results[offset:offset + len(items)])
+            offset += len(items)
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "items": self.items,
+            "splits": self.splits,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
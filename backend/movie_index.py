@@ -0,0 +1,93 @@
+# backend/movie_index.py
+import argparse
+
+import numpy as np
+
+MOVIE_INDEX_FILE = "keyword_movies.npz"
+
+
+class MovieIndex:
+    """Inverted index from keyword row to the movies tagged with it.
+
+    Postings are stored CSR-style: the movies of keyword row i are
+    `movie_ids[offsets[i]:offsets[i + 1]]`, sorted, unique int32 ids.
+    `store_version` is the keyword store the rows refer to.
+    """
+
+    def __init__(self, offsets, movie_ids, n_movies, store_version=""):
+        self.offsets = offsets
+        self.movie_ids = movie_ids
+        self.n_movies = n_movies
+        self.store_version = store_version
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, keyword_rows, movie_ids, n_keywords, n_movies, store_version=""):
+        """Build from parallel (keyword row, movie id) arrays; duplicate pairs are dropped."""
+        keys = np.unique(np.asarray(keyword_rows, dtype=np.int64) * n_movies + np.asarray(movie_ids, dtype=np.int64))
+        rows = keys // n_movies
+        counts = np.bincount(rows, minlength=n_keywords)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(offsets, (keys % n_movies).astype(np.int32), n_movies, store_version)
+
+    def save(self, path=MOVIE_INDEX_FILE):
+        np.savez(path, offsets=self.offsets, movie_ids=self.movie_ids, n_movies=self.n_movies,
+                 store_version=self.store_version)
+
+    @classmethod
+    def load(cls, path=MOVIE_INDEX_FILE):
+        data = np.load(path)
+        return cls(data["offsets"], data["movie_ids"], int(data["n_movies"]), str(data["store_version"]))
+
+    def movies(self, row):
+        return self.movie_ids[self.offsets[row]:self.offsets[row + 1]]
+
+    def match_counts(self, rows):
+        """Number of movies tagged with each keyword row."""
+        rows = np.asarray(rows, dtype=np.int64)
+        return self.offsets[rows + 1] - self.offsets[rows]
+
+    def pair_counts(self, rows):
+        """(n x n) matrix of movies shared by each pair of keyword rows; the diagonal is match_counts.
+
+        The postings are laid out as a bitmap over the union of their movies,
+        so every pairwise intersection comes out of a single matrix product.
+        """
+        postings = [self.movies(row) for row in rows]
+        if not postings:
+            return np.zeros((0, 0), dtype=np.int64)
+        universe = np.unique(np.concatenate(postings))
+        bitmap = np.zeros((len(postings), len(universe)), dtype=np.float32)
+        for i, movies in enumerate(postings):
+            bitmap[i, np.searchsorted(universe, movies)] = 1
+        # float32 sums are exact below 2**24 shared movies
+        return np.rint(bitmap @ bitmap.T).astype(np.int64)
+
+    def shared(self, rows):
+        """Sorted ids of the movies tagged with every one of `rows`."""
+        result = self.movies(rows[0])
+        for row in rows[1:]:
+            result = np.intersect1d(result, self.movies(row), assume_unique=True)
+        return result
+
+
+if __name__ == "__main__":
+    from keyword_store import load_keywords
+
+    parser = argparse.ArgumentParser(description="Look up how many movies match keywords and their combination")
+    parser.add_argument("keywords", nargs="*")
+    parser.add_argument("--cache-file", default="keyword_cache.kwc")
+    parser.add_argument("--index-file", default=MOVIE_INDEX_FILE)
+    args = parser.parse_args()
+
+    index = MovieIndex.load(args.index_file)
+    print(f"{len(index)} keywords, {index.n_movies} movies, {len(index.movie_ids)} postings")
+    if args.keywords:
+        keywords, _ = load_keywords(args.cache_file)
+        row_of = {keyword: i for i, keyword in enumerate(keywords)}
+        rows = [row_of[k] for k in args.keywords]
+        for keyword, count in zip(args.keywords, index.match_counts(rows)):
+            print(f"{keyword}: {count}")
+        print(f"{' + '.join(args.keywords)}: {len(index.shared(rows))}")
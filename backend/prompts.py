@@ -0,0 +1,149 @@
+# backend/prompts.py
+"""Prompt construction for the two gpt-4o stages.
+
+Every call starts with the same system message (role + full instructions), so
+the provider can serve it from its prompt-prefix cache; only the short user
+message that follows varies per request. Templates are whitespace-compacted
+once at import, and the candidate list is capped to a token budget by score.
+"""
+import re
+import threading
+import time
+
+try:
+    import tiktoken
+except ImportError:  # listed in requirements.txt; without it counts are a character-based estimate
+    tiktoken = None
+
+_BLANK_LINES = re.compile(r"\n{2,}")
+
+
+def compact(text):
+    """Strip indentation and trailing spaces from every line and drop blank lines."""
+    return _BLANK_LINES.sub("\n", "\n".join(line.strip() for line in text.strip().splitlines()))
+
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_attempted = None
+# A failed load (e.g. the BPE download) is retried in the background at most this often
+ENCODING_RETRY_SECONDS = 60
+
+
+def load_encoding():
+    """Load the gpt-4o tokenizer. The BPE file is downloaded on first use, so this
+    blocks: it runs as a startup step, off the event loop."""
+    global _encoding, _encoding_attempted
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None:
+            _encoding_attempted = time.monotonic()
+            _encoding = tiktoken.get_encoding("o200k_base")
+    return _encoding
+
+
+def _retry_encoding():
+    try:
+        load_encoding()
+    except Exception as e:
+        print(f"⚠️  tiktoken encoding unavailable ({e}); estimating tokens from length.")
+
+
+def count_tokens(text):
+    if _encoding is None:
+        # Estimate this count only; the encoding keeps being retried in the background
+        if tiktoken is not None and not _encoding_lock.locked() and (
+                _encoding_attempted is None or time.monotonic() - _encoding_attempted >= ENCODING_RETRY_SECONDS):
+            threading.Thread(target=_retry_encoding, daemon=True).start()
+        return (len(text) + 3) // 4
+    return len(_encoding.encode(text))
+
+
+EXPANSION_SYSTEM_PROMPT = compact("""
+    You are a film keyword specialist. Your primary job is to PRESERVE the user's core intent while expanding it with relevant professional terminology. Never lose the main concept.
+
+    Task: Expand the User Input (given in the user message) into 10 specific cinematic keywords while PRESERVING core concepts.
+
+    CRITICAL RULES:
+    1. IDENTIFY CORE KEYWORDS: Extract the main nouns, genres, or themes from the user's input (e.g., "family", "love", "thriller", "90s")
+    2. PRESERVE CORE KEYWORDS: If the user explicitly mentions "family", "romance", "horror", etc., AT LEAST 50% of your output must include or directly relate to that core concept
+    3. EXPAND APPROPRIATELY: Add related emotional tones, sub-genres, or narrative elements that ENHANCE the core concept, not replace it
+    4. USE PROFESSIONAL TERMINOLOGY: Convert casual language to film industry terms (e.g., "sad" → "Melancholic", "funny" → "Comedic")
+    5. MEDIA TYPE PRESERVATION: If the user asks for a "Movie", focus ONLY on film-related terms. Avoid TV-related terms like "Drama", "Series", or "K-Drama" unless the user explicitly asked for them.
+
+    Examples:
+    - Input: "Feel-good family film" → Output must include: "Family", "Family-friendly", "Family bonding", "Wholesome", "All-ages", etc.
+    - Input: "Intense love stories" → Output must include: "Romance", "Romantic", "Love", "Passionate", "Star-crossed", etc.
+    - Input: "90s nostalgia" → Output must include: "90s", "1990s", "Nostalgia", "Retro", etc.
+
+    Output ONLY 10 keywords/phrases separated by commas. Ensure the core concept is clearly maintained.
+""")
+
+VERIFICATION_SYSTEM_PROMPT = compact("""
+    You are a precision movie search filter. Your job is to eliminate ambiguous keywords that could apply to multiple genres when the user specified a specific context, to ensure the user's "Primary Intent" is preserved in every single keyword returned. Your response must be a single line of comma-separated strings.
+
+    The user message gives the User's Original Intent, the Database Candidates and, when known, the Valid Combinations.
+
+    CRITICAL RULE:
+    - A keyword is valid ONLY if it covers the ENTIRE intent.
+    - If a candidate from the list only covers partially, you ARE FORBIDDEN from using it alone. You MUST combine it with another candidate using a '+' sign.
+    - If the user specifies a media type (e.g., Movie or TV Series), you MUST NOT use keywords that are exclusive to the other format.
+
+    Task:
+    1. DECONSTRUCT INTENT: Break down the user's intent into its essential components.
+    2. INTERSECTION PRINCIPLE: Every output keyword must represent the INTERSECTION of all essential components.
+    3. COMBINATION LOGIC:
+    - If a single keyword in 'Database Candidates' already captures the full intersection, use it.
+    - Otherwise, you MUST create a combined term by joining a keyword for Component A and a keyword for Component B from the 'Database Candidates' using a ' + ' sign.
+    - Combine only up to 2 keywords, not more than that.
+    - If 'Valid Combinations' is given, use ONLY combinations from that list (they are the pairs that share at least one movie, most shared first); any other pair matches no movie. If it is "none", use single keywords only.
+    4. ANTI-GENERALIZATION RULE:
+    - DO NOT return a keyword that only covers part of the intent.
+    5. SOURCE INTEGRITY: Use ONLY exact strings from 'Database Candidates'. Do not shorten or modify them except for joining with ' + '.
+    6. SELECTION: Return 5-8 most relevant, high-precision keywords/combinations.
+    7. FILTERING: Remove any candidate that is out of user's intent or is irrelevant.
+    8. RANKING RULE: List the keywords in order of relevance to the User's Original Intent.
+
+    CRITICAL OUTPUT RULES:
+    - Output ONLY the keywords separated by commas.
+    - **DO NOT include any labels, core context, intros, or outros.**
+""")
+
+
+def fit_candidates(candidates, budget):
+    """Longest best-first prefix of `candidates` whose ", "-joined list fits in `budget` tokens."""
+    kept = []
+    used = 0
+    for candidate in candidates:
+        cost = count_tokens(candidate) + (1 if kept else 0)  # ", " separator
+        if kept and used + cost > budget:
+            break
+        kept.append(candidate)
+        used += cost
+    return kept
+
+
+def expansion_messages(user_input):
+    return [
+        {"role": "system", "content": EXPANSION_SYSTEM_PROMPT},
+        {"role": "user", "content": f'User Input: "{user_input.strip()}"'},
+    ]
+
+
+def verification_messages(user_input, candidate_list, combinations=None):
+    """`candidate_list` and `combinations` must already be capped (see fit_candidates).
+
+    `combinations` ("A + B" labels) is None when no keyword→movie index is loaded.
+    """
+    content = (f'User\'s Original Intent: "{user_input.strip()}"\n'
+               f'Database Candidates: {", ".join(candidate_list)}')
+    if combinations is not None:
+        content += f'\nValid Combinations: {", ".join(combinations) or "none"}'
+    return [
+        {"role": "system", "content": VERIFICATION_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def message_tokens(messages):
+    # ~3 tokens of chat framing per message
+    return sum(count_tokens(m["content"]) + 3 for m in messages)
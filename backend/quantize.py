@@ -0,0 +1,122 @@
+# backend/quantize.py
+"""Compact keyword vector encodings: float16, and int8 with per-dimension scales.
+
+    python quantize.py keyword_cache.kwc --dtype int8
+
+reports the memory saved and the recall@k and per-query latency of scanning the
+compact form, with and without re-scoring the top candidates in full precision,
+next to a plain float32 scan. The compact scan decodes every chunk back to
+float32, so it is slower than the float32 one: the savings are memory, not time.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from retrieval import KeywordIndex, normalize_rows, select_top_k
+
+QUANTIZED_DTYPES = ("float16", "int8")
+
+
+def quantize(vectors, dtype):
+    """Return (data, scales) for normalized `vectors`; `scales` is None for float16."""
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        # One scale per dimension, so each column uses the full [-127, 127] range
+        scales = np.abs(vectors).max(axis=0).astype(np.float32) / 127
+        scales[scales == 0] = 1
+        data = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+        return data, scales
+    raise ValueError(f"Unsupported vector dtype {dtype!r} (expected one of {QUANTIZED_DTYPES})")
+
+
+class QuantizedVectors:
+    """Row-indexable compact vectors that decode to float32 on access.
+
+    Indexing (`vectors[i]`, `vectors[ids]`, slices) returns float32 rows, so it
+    can stand in for the full matrix wherever only a few rows are read. Full
+    scans go through `scores()`, which decodes one chunk at a time instead of
+    materializing a float32 copy of the whole matrix.
+    """
+
+    def __init__(self, data, scales=None, chunk_rows=16384):
+        self.data = data
+        self.scales = scales
+        self.chunk_rows = chunk_rows
+
+    @property
+    def dtype(self):
+        return self.data.dtype.name
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        rows = np.asarray(self.data[index], dtype=np.float32)
+        if self.scales is not None:
+            rows *= self.scales
+        return rows
+
+    def scores(self, queries):
+        """Inner products of `queries` (n_queries x dim) with every row, as float32."""
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.scales is not None:
+            # (q * s) . x == q . (s * x): fold the scales into the queries once
+            queries = queries * self.scales
+        scores = np.empty((len(queries), len(self.data)), dtype=np.float32)
+        for start in range(0, len(self.data), self.chunk_rows):
+            chunk = np.asarray(self.data[start:start + self.chunk_rows], dtype=np.float32)
+            scores[:, start:start + len(chunk)] = queries @ chunk.T
+        return scores
+
+
+def quantization_report(vectors, dtype, n_queries=200, k=5, rescore_factor=4, noise=0.05, seed=0):
+    """Print memory, recall@k and latency of a quantized scan against exact float32 search."""
+    rng = np.random.default_rng(seed)
+    vectors = normalize_rows(vectors)
+    compact = QuantizedVectors(*quantize(vectors, dtype))
+    queries = vectors[rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)]
+    queries = normalize_rows(queries + rng.normal(scale=noise, size=queries.shape).astype(np.float32))
+
+    truth, _ = select_top_k(queries @ vectors.T, k)
+    full_mb, compact_mb = vectors.nbytes / 2**20, compact.nbytes / 2**20
+    print(f"{dtype}: {compact_mb:.1f} MB scanned instead of {full_mb:.1f} MB "
+          f"({100 * (1 - compact_mb / full_mb):.0f}% saved)")
+    print(f"{'mode':>16} {'recall@' + str(k):>10} {'ms/query':>10} {'vs float32':>10}")
+    baseline = None
+    for name, index in (
+        ("float32", KeywordIndex(range(len(vectors)), vectors, normalized=True)),
+        ("quantized", KeywordIndex(range(len(vectors)), vectors, normalized=True, compact=compact,
+                                   rescore=False, rescore_factor=rescore_factor)),
+        ("+ rescore", KeywordIndex(range(len(vectors)), vectors, normalized=True, compact=compact,
+                                   rescore=True, rescore_factor=rescore_factor)),
+    ):
+        start = time.perf_counter()
+        found, _ = index.top_k(queries, k)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        baseline = baseline or ms
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+        print(f"{name:>16} {hits / truth.size:>10.3f} {ms:>10.3f} {ms / baseline:>9.1f}x")
+
+
+if __name__ == "__main__":
+    from keyword_store import load_keywords
+
+    parser = argparse.ArgumentParser(description="Memory and recall report for quantized keyword vectors")
+    parser.add_argument("cache_file", nargs="?", default="keyword_cache.kwc")
+    parser.add_argument("--dtype", choices=QUANTIZED_DTYPES, default="int8")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    _, vectors = load_keywords(args.cache_file)
+    quantization_report(np.asarray(vectors[:], dtype=np.float32), args.dtype, n_queries=args.queries, k=args.k)
@@ -0,0 +1,55 @@
+# backend/rerank.py
+import itertools
+
+import numpy as np
+
+from retrieval import normalize_rows
+
+
+def intent_scores(vectors, intent_vector, expanded_vectors, intent_weight=0.5):
+    """How well each (normalized) row covers the user's intent.
+
+    A blend of similarity to the raw user input and mean similarity to the
+    expanded keywords, so a vector that spans several intent components beats
+    one that matches a single component very closely.
+    """
+    intent = vectors @ intent_vector
+    coverage = (vectors @ expanded_vectors.T).mean(axis=1)
+    return intent_weight * intent + (1 - intent_weight) * coverage
+
+
+def rerank(candidates, candidate_vectors, intent_vector, expanded_vectors,
+           max_results=8, pair_pool=12, pair_margin=0.02, intent_weight=0.5, pair_counts=None):
+    """Deterministic local replacement for the step-3 verification call.
+
+    Scores every candidate against the intent, then forms "A + B" pairs from
+    the best `pair_pool` candidates whose combined vector beats both members
+    by at least `pair_margin`. With `pair_counts` (movies shared by each pair
+    of candidates), pairs that share no movie are skipped. Returns up to
+    `max_results` labels, best first.
+    """
+    if not candidates:
+        return []
+    intent_vector = normalize_rows(intent_vector[None, :])[0]
+    expanded_vectors = normalize_rows(expanded_vectors)
+    candidate_vectors = normalize_rows(candidate_vectors)
+
+    single = intent_scores(candidate_vectors, intent_vector, expanded_vectors, intent_weight)
+    ranked = [(float(score), candidates[i]) for i, score in enumerate(single)]
+
+    pool = np.argsort(-single, kind="stable")[:pair_pool]
+    pairs = list(itertools.combinations(pool, 2))
+    if pairs:
+        a, b = np.array(pairs).T
+        combined = normalize_rows(candidate_vectors[a] + candidate_vectors[b])
+        pair_scores = intent_scores(combined, intent_vector, expanded_vectors, intent_weight)
+        better = pair_scores >= np.maximum(single[a], single[b]) + pair_margin
+        if pair_counts is not None:
+            better &= pair_counts[a, b] > 0
+        ranked.extend(
+            (float(score), f"{candidates[i]} + {candidates[j]}")
+            for i, j, score in zip(a[better], b[better], pair_scores[better])
+        )
+
+    ranked.sort(key=lambda item: -item[0])
+    return [label for _, label in ranked[:max_results]]
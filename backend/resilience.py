@@ -0,0 +1,271 @@
+# backend/resilience.py
+import asyncio
+import math
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import UPSTREAM_EVENTS
+from singleflight import consume_exception
+
+
+class Unavailable(Exception):
+    """The upstream is not accepting work right now; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Overloaded(Unavailable):
+    pass
+
+
+class CircuitOpen(Unavailable):
+    pass
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds a single trial call is let through (half-open) to decide whether to close."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0
+        return max(1, math.ceil(self.reset_timeout - (time.monotonic() - self.opened_at)))
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def abandon_trial(self):
+        self._trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial = False
+
+
+class UpstreamGuard:
+    """Bounded concurrency, load shedding, a deadline, hedging and a circuit breaker for one upstream stage.
+
+    At most `max_concurrency` calls run at once and at most `max_queue` wait
+    for a slot; beyond that calls are shed with `Overloaded`. The deadline
+    covers queueing and every attempt. Once `hedge_min_samples` latencies are
+    known, an attempt still running past their `hedge_quantile` gets a
+    duplicate (if a slot is free) and the first success wins.
+    """
+
+    def __init__(self, name, max_concurrency=32, max_queue=64, deadline=20.0, hedge=True,
+                 hedge_quantile=0.95, hedge_min_samples=20, failure_threshold=5, reset_timeout=30.0,
+                 is_failure=lambda e: True):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.is_failure = is_failure
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latencies = deque(maxlen=200)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._admitted = 0  # queued + running
+        self._running = 0
+        self.counts = {"calls": 0, "shed": 0, "deadline": 0, "failure": 0, "circuit_open": 0,
+                       "hedged": 0, "hedge_win": 0}
+
+    def _event(self, event):
+        self.counts[event] += 1
+        UPSTREAM_EVENTS.inc(stage=self.name, event=event)
+
+    def hedge_delay(self):
+        if not self.hedge or len(self.latencies) < self.hedge_min_samples:
+            return None
+        return float(np.quantile(self.latencies, self.hedge_quantile))
+
+    def retry_after(self):
+        typical = float(np.median(self.latencies)) if self.latencies else 1.0
+        queued = self._admitted - self._running
+        return max(1, math.ceil(typical * (queued + 1) / self.max_concurrency))
+
+    def _admit(self):
+        if self._admitted >= self.max_concurrency + self.max_queue:
+            self._event("shed")
+            raise Overloaded(f"{self.name} queue is full", self.retry_after())
+        if not self.breaker.allow():
+            self._event("circuit_open")
+            raise CircuitOpen(f"{self.name} circuit is open", self.breaker.retry_after())
+        self.counts["calls"] += 1
+
+    async def call(self, fn, hedge=True):
+        """Run the coroutine factory `fn` under the guard and return its result."""
+        self._admit()
+        self._admitted += 1
+        try:
+            result = await asyncio.wait_for(self._run(fn, hedge), self.deadline)
+        except asyncio.TimeoutError:
+            self._event("deadline")
+            self.breaker.record_failure()
+            raise DeadlineExceeded(f"{self.name} exceeded its {self.deadline:g}s deadline")
+        except asyncio.CancelledError:
+            self.breaker.abandon_trial()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._event("failure")
+                self.breaker.record_failure()
+            else:
+                # Says nothing about upstream health, but must not hold on to a half-open trial
+                self.breaker.abandon_trial()
+            raise
+        finally:
+            self._admitted -= 1
+        self.breaker.record_success()
+        return result
+
+    async def stream(self, fn):
+        """Iterate the async iterable returned by the coroutine factory `fn` under the guard.
+
+        Unlike `call`, the slot is held and the deadline keeps running until the
+        stream is exhausted, and an error partway through counts against the
+        breaker. Streams are never hedged.
+        """
+        self._admit()
+        self._admitted += 1
+        deadline = time.monotonic() + self.deadline
+        acquired = exhausted = False
+        source = None
+        try:
+            await self._within(self._semaphore.acquire(), deadline)
+            acquired = True
+            self._running += 1
+            start = time.perf_counter()
+            source = await self._within(fn(), deadline)
+            iterator = source.__aiter__()
+            while True:
+                try:
+                    item = await self._within(iterator.__anext__(), deadline)
+                except StopAsyncIteration:
+                    break
+                yield item
+            exhausted = True
+            self.latencies.append(time.perf_counter() - start)
+            self.breaker.record_success()
+        except (GeneratorExit, asyncio.CancelledError):
+            # Closed or cancelled by the consumer: says nothing about upstream health
+            self.breaker.abandon_trial()
+            raise
+        finally:
+            # Release the connection of a stream that was abandoned partway
+            close = getattr(source, "aclose", None) or getattr(source, "close", None)
+            if not exhausted and close is not None:
+                await close()
+            if acquired:
+                self._running -= 1
+                self._semaphore.release()
+            self._admitted -= 1
+
+    async def _within(self, awaitable, deadline):
+        """Await one step of `stream` before `deadline`, recording a failure on the breaker."""
+        try:
+            return await asyncio.wait_for(awaitable, max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._event("deadline")
+            self.breaker.record_failure()
+            raise DeadlineExceeded(f"{self.name} exceeded its {self.deadline:g}s deadline")
+        except StopAsyncIteration:
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._event("failure")
+                self.breaker.record_failure()
+            else:
+                self.breaker.abandon_trial()
+            raise
+
+    async def _run(self, fn, hedge):
+        await self._semaphore.acquire()
+        self._running += 1
+        try:
+            start = time.perf_counter()
+            result = await (self._hedged(fn) if hedge else fn())
+            self.latencies.append(time.perf_counter() - start)
+            return result
+        finally:
+            self._running -= 1
+            self._semaphore.release()
+
+    async def _hedged(self, fn):
+        first = asyncio.ensure_future(fn())
+        first.add_done_callback(consume_exception)
+        tasks = [first]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+            # Only hedge with spare capacity, so a slow upstream is not hit twice as hard
+            if first.done() or delay is None or self._semaphore.locked():
+                return await first
+            async with self._semaphore:
+                self._event("hedged")
+                second = asyncio.ensure_future(fn())
+                second.add_done_callback(consume_exception)
+                tasks.append(second)
+                pending = set(tasks)
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is second:
+                                self._event("hedge_win")
+                            return task.result()
+                return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        delay = self.hedge_delay()
+        return {
+            "running": self._running,
+            "queued": self._admitted - self._running,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "deadline_seconds": self.deadline,
+            "hedge_after_ms": round(delay * 1000, 1) if delay is not None else None,
+            "circuit": self.breaker.state,
+            **self.counts,
+        }
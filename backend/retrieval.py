@@ -0,0 +1,109 @@
+# backend/retrieval.py
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """L2-normalize each row; all-zero rows are left as zeros."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class KeywordIndex:
+    """Exact cosine-similarity search over the keyword database.
+
+    The keyword matrix is normalized once at construction, so scoring a batch
+    of queries is a single matrix multiply. When an approximate index (see
+    ann.py) is attached, queries go through it instead of the full scan.
+    Pass `normalized=True` for vectors that are already unit length (e.g. a
+    memory-mapped keyword store) to use them in place without a private copy.
+
+    With a `compact` (quantized, see quantize.py) copy of the vectors, the scan
+    runs on it instead; the best `k * rescore_factor` hits are then re-scored
+    against the full-precision `vectors` unless `rescore` is False.
+    """
+
+    def __init__(self, keywords, vectors, ann=None, nprobe=8, normalized=False,
+                 compact=None, rescore=True, rescore_factor=4):
+        self.keywords = keywords
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.ann = ann
+        self.nprobe = nprobe
+        self.compact = compact
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+
+    def __len__(self):
+        return len(self.keywords)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def top_k(self, query_vectors, k=5):
+        """Return (indices, scores), each shaped (n_queries, k), best first."""
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        if self.compact is not None:
+            return self._compact_top_k(queries, k)
+        if self.ann is not None:
+            return self.ann.search(self.vectors, queries, k, self.nprobe)
+        scores = queries @ self.vectors.T
+        return select_top_k(scores, k)
+
+    def _compact_top_k(self, queries, k):
+        pool = k * self.rescore_factor if self.rescore else k
+        if self.ann is not None:
+            indices, scores = self.ann.search(self.compact, queries, pool, self.nprobe)
+        else:
+            indices, scores = select_top_k(self.compact.scores(queries), pool)
+        if not self.rescore:
+            return indices, scores
+
+        # Exact scores for the shortlisted rows only; empty ANN slots (-1) stay -inf
+        rows = self.vectors[indices.clip(0).ravel()].reshape(indices.shape + (self.dim,))
+        exact = np.einsum("qpd,qd->qp", rows, queries)
+        exact[indices < 0] = -np.inf
+        top, top_scores = select_top_k(exact, k)
+        return np.take_along_axis(indices, top, axis=1), top_scores
+
+    def search(self, query_vectors, top_k=5, threshold=0.45):
+        """Return [(keyword, score), ...] merged over all queries, best first."""
+        indices, scores = self.top_k(query_vectors, top_k)
+        return self.merge(indices, scores, threshold)
+
+    def merge(self, indices, scores, threshold=0.45):
+        """Deduplicate per-query hits above `threshold`, keeping each keyword's best score."""
+        ids, best = self.merge_ids(indices, scores, threshold)
+        return [(self.keywords[i], float(s)) for i, s in zip(ids, best)]
+
+    def merge_ids(self, indices, scores, threshold=0.45):
+        """Like merge(), but return (keyword indices, scores) arrays, best first."""
+        mask = scores >= threshold
+        hit_indices = indices[mask]
+        hit_scores = scores[mask]
+        if hit_indices.size == 0:
+            return hit_indices, hit_scores
+
+        order = np.argsort(-hit_scores, kind="stable")
+        hit_indices = hit_indices[order]
+        hit_scores = hit_scores[order]
+        _, first = np.unique(hit_indices, return_index=True)
+        first.sort()
+        return hit_indices[first], hit_scores[first]
+
+
+def select_top_k(scores, k):
+    """Partial-sort each row of `scores` and return its top-k (indices, scores), best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(k), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
@@ -0,0 +1,41 @@
+# backend/singleflight.py
+import asyncio
+
+
+def consume_exception(task):
+    # Mark the exception as retrieved so it is not logged when every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key onto one execution.
+
+    The first caller for a key starts `fn()`; callers arriving while it is
+    still running await the same task. The task is shielded, so a waiter that
+    disconnects does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            task.add_done_callback(consume_exception)
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
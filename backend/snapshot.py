@@ -0,0 +1,65 @@
+# backend/snapshot.py
+import hashlib
+import os
+import time
+
+
+def file_signature(paths):
+    """(mtime, size) per path, or None if missing; changes whenever a file is replaced."""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def file_tag(entry):
+    """Short id of one file_signature() entry, used to fold a side file into a version."""
+    return hashlib.sha1(repr(entry).encode()).hexdigest()[:8]
+
+
+class CacheSnapshot:
+    """One loaded version of the keyword DB, swapped as a unit on reload.
+
+    Requests take a reference to the active snapshot once and use it for every
+    stage, so a reload never changes the keywords or vectors under a request
+    that is already running; the old snapshot is freed when the last one ends.
+    """
+
+    def __init__(self, index, lexical, version, source, signature, load_seconds, movies=None):
+        self.index = index
+        self.lexical = lexical
+        self.movies = movies
+        self.version = version
+        self.source = source
+        self.signature = signature
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def keywords(self):
+        return self.index.keywords
+
+    @property
+    def vectors(self):
+        return self.index.vectors
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "source": self.source,
+            "keywords": len(self),
+            "ann": self.index.ann is not None,
+            "scan_dtype": self.index.compact.dtype if self.index.compact is not None else "float32",
+            "rescore": self.index.compact is not None and self.index.rescore,
+            "movies": self.movies.n_movies if self.movies is not None else None,
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.loaded_at)),
+            "load_seconds": round(self.load_seconds, 3),
+        }
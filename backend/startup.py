@@ -0,0 +1,76 @@
+# backend/startup.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import STARTUP_SECONDS
+
+
+def process_age():
+    """Seconds since this process was started, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/stat") as f:
+            # starttime is field 22; fields are counted after the parenthesised command name
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+
+
+class StartupProgress:
+    """Named startup steps that run in the background after the server starts listening.
+
+    Each step is wrapped in `step(name)`, which records its state and duration;
+    `report()` is what the readiness probe shows while they run.
+    """
+
+    def __init__(self, steps):
+        self.started = time.perf_counter()
+        self.steps = {name: {"state": "pending"} for name in steps}
+        self.milestones = {}
+        self._lock = threading.Lock()
+
+    def mark(self, milestone, seconds):
+        """Record a cold-start milestone (seconds since process start)."""
+        self.milestones[milestone] = round(seconds, 3)
+        STARTUP_SECONDS.set(seconds, milestone=milestone)
+
+    @contextmanager
+    def step(self, name):
+        entry = self.steps[name]
+        with self._lock:
+            entry["state"] = "running"
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            with self._lock:
+                entry.update(state="failed", error=str(e))
+            raise
+        with self._lock:
+            entry.update(state="done", seconds=round(time.perf_counter() - start, 3))
+
+    def skip_pending(self, reason):
+        """Give up on steps that have not started, e.g. after an earlier step failed."""
+        with self._lock:
+            for entry in self.steps.values():
+                if entry["state"] == "pending":
+                    entry.update(state="skipped", error=reason)
+
+    @property
+    def finished(self):
+        return all(entry["state"] in ("done", "failed", "skipped") for entry in self.steps.values())
+
+    def report(self):
+        with self._lock:
+            steps = {name: dict(entry) for name, entry in self.steps.items()}
+        done = sum(entry["state"] == "done" for entry in steps.values())
+        return {
+            "progress": f"{done}/{len(steps)}",
+            "elapsed_seconds": round(time.perf_counter() - self.started, 3),
+            "steps": steps,
+            "cold_start_seconds": dict(self.milestones),
+        }
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Backend modules import each other as top-level modules (uvicorn runs from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main.py refuses to import without a key; tests never reach the real API
+os.environ.setdefault("OPENAI_API_KEY", "test")
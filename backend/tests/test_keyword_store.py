@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from keyword_store import open_store, write_store
+from quantize import QuantizedVectors
+from retrieval import KeywordIndex, normalize_rows
+
+KEYWORDS = ["Romance", "90s", "Nostalgia", "가족 영화", "Coming-of-age"]
+
+
+def vectors(rows=len(KEYWORDS), dim=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+
+
+def test_float32_round_trip(tmp_path):
+    path = tmp_path / "keywords.kwc"
+    original = vectors()
+    header = write_store(path, KEYWORDS, original, "text-embedding-3-small")
+
+    store = open_store(path, verify=True)
+    assert list(store.keywords) == KEYWORDS
+    assert store.keywords[-1] == KEYWORDS[-1] and store.keywords[1:3] == KEYWORDS[1:3]
+    assert store.header["model"] == "text-embedding-3-small" and store.full_precision
+    assert store.compact is None
+    assert store.version == header["checksum"][:16]
+    np.testing.assert_allclose(store.vectors, normalize_rows(original), atol=1e-6)
+
+
+def test_int8_without_full_precision_round_trip(tmp_path):
+    path = tmp_path / "keywords.kwc"
+    original = vectors()
+    write_store(path, KEYWORDS, original, "text-embedding-3-small", dtype="int8", full_precision=False)
+
+    store = open_store(path, verify=True)
+    assert not store.full_precision
+    assert isinstance(store.vectors, QuantizedVectors) and store.vectors is store.compact
+    assert store.compact.dtype == "int8"
+    # Decoded rows stay within half a quantization step of the normalized input
+    np.testing.assert_allclose(store.vectors[:], normalize_rows(original), atol=0.5 * store.compact.scales.max())
+    assert store.vectors[2].shape == (original.shape[1],)
+
+
+def test_corrupted_byte_fails_verification(tmp_path):
+    path = tmp_path / "keywords.kwc"
+    header = write_store(path, KEYWORDS, vectors(), "text-embedding-3-small")
+    data = bytearray(path.read_bytes())
+    data[header["vectors_offset"] + 5] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    open_store(path)  # opening alone does not read the vectors
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        open_store(path, verify=True)
+
+
+def test_top_k_matches_brute_force():
+    keywords = [f"kw{i}" for i in range(500)]
+    index = KeywordIndex(keywords, vectors(500, 32, seed=1))
+    queries = vectors(20, 32, seed=2)
+
+    indices, scores = index.top_k(queries, 7)
+    exact = normalize_rows(queries) @ normalize_rows(vectors(500, 32, seed=1)).T
+    np.testing.assert_array_equal(indices, np.argsort(-exact, axis=1)[:, :7])
+    np.testing.assert_allclose(scores, np.sort(exact, axis=1)[:, ::-1][:, :7], rtol=1e-5)
+
+    # merge_ids keeps every keyword once, with its best score over all queries
+    ids, best = index.merge_ids(indices, scores, threshold=0.0)
+    expected = {}
+    for row_indices, row_scores in zip(indices, scores):
+        for i, s in zip(row_indices, row_scores):
+            if s >= 0.0:
+                expected[i] = max(expected.get(i, -np.inf), s)
+    assert sorted(ids.tolist()) == sorted(expected)
+    np.testing.assert_allclose(best, [expected[i] for i in ids])
+    assert np.all(np.diff(best) <= 0)
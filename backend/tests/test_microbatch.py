@@ -0,0 +1,51 @@
+import asyncio
+
+from microbatch import MicroBatcher
+
+
+class Rejected(Exception):
+    pass
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def upper(items):
+    await asyncio.sleep(0)
+    if "" in items:
+        raise Rejected("empty input")
+    return [item.upper() for item in items]
+
+
+def test_concurrent_submissions_share_one_call():
+    async def scenario():
+        batcher = MicroBatcher(upper, window=0.01)
+        results = await asyncio.gather(batcher.submit(["a", "b"]), batcher.submit(["c"]))
+        return batcher, results
+
+    batcher, results = run(scenario())
+    assert results == [["A", "B"], ["C"]]
+    assert batcher.batches == 1 and batcher.items == 3
+
+
+def test_failed_batch_only_fails_the_offending_submitter():
+    async def scenario():
+        batcher = MicroBatcher(upper, window=0.01)
+        results = await asyncio.gather(
+            batcher.submit(["romance", "nostalgia"]), batcher.submit([""]), return_exceptions=True
+        )
+        return batcher, results
+
+    batcher, results = run(scenario())
+    assert results[0] == ["ROMANCE", "NOSTALGIA"]
+    assert isinstance(results[1], Rejected)
+    assert batcher.splits == 1
+
+
+def test_failed_batch_is_not_split_when_split_on_declines():
+    async def scenario():
+        batcher = MicroBatcher(upper, window=0.01, split_on=lambda e: False)
+        return await asyncio.gather(batcher.submit(["a"]), batcher.submit([""]), return_exceptions=True)
+
+    assert all(isinstance(result, Rejected) for result in run(scenario()))
@@ -0,0 +1,35 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import prompts
+
+
+def test_failed_encoding_load_only_estimates_until_a_retry_succeeds(monkeypatch):
+    class Encoding:
+        def encode(self, text):
+            return text.split()
+
+    attempts = []
+
+    def get_encoding(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("download failed")
+        return Encoding()
+
+    monkeypatch.setattr(prompts, "_encoding", None)
+    monkeypatch.setattr(prompts, "_encoding_attempted", None)
+    monkeypatch.setattr(prompts, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+    monkeypatch.setattr(prompts, "ENCODING_RETRY_SECONDS", 0)
+
+    with pytest.raises(OSError):
+        prompts.load_encoding()
+    assert prompts.count_tokens("one two three four") == 5  # (18 + 3) // 4, and a retry starts
+    for _ in range(100):
+        if prompts._encoding is not None:
+            break
+        time.sleep(0.01)
+    assert prompts.count_tokens("one two three four") == 4
+    assert attempts == ["o200k_base", "o200k_base"]
@@ -0,0 +1,222 @@
+import asyncio
+import time
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, Overloaded, UpstreamGuard
+
+
+class Rejected(Exception):
+    pass
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+async def fail(error=RuntimeError("upstream down")):
+    raise error
+
+
+def test_breaker_opens_after_threshold_and_recovers_through_one_trial(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # only a single trial call
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    breaker.record_failure()
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.retry_after() == 10
+
+
+def test_guard_opens_circuit_and_rejects_without_calling():
+    async def scenario():
+        guard = UpstreamGuard("test", failure_threshold=2, reset_timeout=60)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await guard.call(lambda: fail())
+        calls = []
+        with pytest.raises(CircuitOpen):
+            await guard.call(lambda: calls.append(1) or value("ok"))
+        return guard, calls
+
+    guard, calls = run(scenario())
+    assert calls == []
+    assert guard.counts["failure"] == 2 and guard.counts["circuit_open"] == 1
+
+
+def test_non_failure_error_releases_half_open_trial():
+    async def scenario():
+        guard = UpstreamGuard("test", failure_threshold=1, reset_timeout=0.01,
+                              is_failure=lambda e: not isinstance(e, Rejected))
+        with pytest.raises(RuntimeError):
+            await guard.call(lambda: fail())
+        await asyncio.sleep(0.02)
+        assert guard.breaker.state == "half_open"
+        with pytest.raises(Rejected):
+            await guard.call(lambda: fail(Rejected("bad request")))
+        # The trial slot is free again, so the next call gets through and closes the circuit
+        assert await guard.call(lambda: value("ok")) == "ok"
+        return guard
+
+    assert run(scenario()).breaker.state == "closed"
+
+
+def test_guard_sheds_beyond_concurrency_plus_queue():
+    async def scenario():
+        guard = UpstreamGuard("test", max_concurrency=1, max_queue=1, hedge=False)
+        results = await asyncio.gather(
+            *[guard.call(lambda: value("ok", 0.05)) for _ in range(3)], return_exceptions=True
+        )
+        return guard, results
+
+    guard, results = run(scenario())
+    assert results[:2] == ["ok", "ok"]
+    assert isinstance(results[2], Overloaded) and results[2].retry_after >= 1
+    assert guard.counts["shed"] == 1
+    assert guard.stats()["queued"] == 0 and guard.stats()["running"] == 0
+
+
+def test_deadline_covers_the_call_and_counts_as_failure():
+    async def scenario():
+        guard = UpstreamGuard("test", deadline=0.05, failure_threshold=1, hedge=False)
+        with pytest.raises(DeadlineExceeded):
+            await guard.call(lambda: value("late", 1))
+        return guard
+
+    guard = run(scenario())
+    assert guard.counts["deadline"] == 1
+    assert guard.breaker.state == "open"
+
+
+def test_hedge_duplicates_a_slow_call_and_first_success_wins():
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        # The first attempt hangs, the hedged duplicate answers quickly
+        return value("first", 5) if len(attempts) == 1 else value("hedge")
+
+    async def scenario():
+        guard = UpstreamGuard("test", max_concurrency=4, deadline=2, hedge_min_samples=5)
+        guard.latencies.extend([0.01] * 5)
+        start = time.perf_counter()
+        result = await guard.call(fn)
+        return guard, result, time.perf_counter() - start
+
+    guard, result, elapsed = run(scenario())
+    assert result == "hedge" and elapsed < 1
+    assert len(attempts) == 2
+    assert guard.counts["hedged"] == 1 and guard.counts["hedge_win"] == 1
+
+
+def test_no_hedge_without_enough_samples_or_a_free_slot():
+    async def scenario():
+        guard = UpstreamGuard("test", max_concurrency=1, hedge_min_samples=5)
+        assert guard.hedge_delay() is None
+        guard.latencies.extend([0.001] * 5)
+        # The only slot is taken by the call itself, so it is never duplicated
+        return guard, await guard.call(lambda: value("ok", 0.05))
+
+    guard, result = run(scenario())
+    assert result == "ok" and guard.counts["hedged"] == 0
+
+
+async def chunks(items, delay=0.0, error=None):
+    async def gen():
+        for item in items:
+            await asyncio.sleep(delay)
+            yield item
+        if error is not None:
+            raise error
+    return gen()
+
+
+async def drain(stream):
+    return [item async for item in stream]
+
+
+def test_stream_deadline_covers_the_whole_read():
+    async def scenario():
+        guard = UpstreamGuard("test", deadline=0.1, failure_threshold=1)
+        start = time.perf_counter()
+        # Opens instantly, but the chunks take far longer than the deadline
+        with pytest.raises(DeadlineExceeded):
+            await drain(guard.stream(lambda: chunks(["a", "b", "c"], 0.5)))
+        return guard, time.perf_counter() - start
+
+    guard, elapsed = run(scenario())
+    assert elapsed < 0.4
+    assert guard.counts["deadline"] == 1 and guard.breaker.state == "open"
+    assert guard.stats()["running"] == 0 and guard.stats()["queued"] == 0
+
+
+def test_stream_holds_its_slot_until_exhausted():
+    async def scenario():
+        guard = UpstreamGuard("test", max_concurrency=1, max_queue=0)
+        stream = guard.stream(lambda: chunks(["a", "b"], 0.01))
+        assert await stream.__anext__() == "a"
+        assert guard.stats()["running"] == 1
+        with pytest.raises(Overloaded):
+            await guard.call(lambda: value("ok"))
+        assert await drain(stream) == ["b"]
+        return guard, await guard.call(lambda: value("ok"))
+
+    guard, result = run(scenario())
+    assert result == "ok" and guard.stats()["running"] == 0
+
+
+def test_stream_error_partway_counts_as_failure():
+    async def scenario():
+        guard = UpstreamGuard("test", failure_threshold=1)
+        received = []
+        with pytest.raises(RuntimeError):
+            async for item in guard.stream(lambda: chunks(["a"], error=RuntimeError("reset"))):
+                received.append(item)
+        return guard, received
+
+    guard, received = run(scenario())
+    assert received == ["a"]
+    assert guard.counts["failure"] == 1 and guard.breaker.state == "open"
+
+
+def test_stream_closed_early_releases_slot_and_trial():
+    async def scenario():
+        guard = UpstreamGuard("test", max_concurrency=1, failure_threshold=1, reset_timeout=0.01)
+        with pytest.raises(RuntimeError):
+            await guard.call(lambda: fail())
+        await asyncio.sleep(0.02)
+        stream = guard.stream(lambda: chunks(["a", "b"]))
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        assert guard.stats()["running"] == 0
+        # Neither a success nor a failure: the next call is the trial
+        assert guard.breaker.state == "half_open"
+        return guard, await guard.call(lambda: value("ok"))
+
+    guard, result = run(scenario())
+    assert result == "ok" and guard.breaker.state == "closed"
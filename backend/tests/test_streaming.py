@@ -0,0 +1,48 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from resilience import DeadlineExceeded, UpstreamGuard
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+def fake_client(texts, delay):
+    async def create(**kwargs):
+        async def stream():
+            for text in texts:
+                await asyncio.sleep(delay)
+                yield chunk(text)
+        return stream()
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+@pytest.mark.parametrize("stage, guard_name, start", [
+    ("expansion", "EXPANSION_GUARD", lambda: main.stream_expansion("90s romance")),
+    ("verification", "VERIFICATION_GUARD", lambda: main.stream_verification("90s romance", ["Romance", "90s"])),
+])
+def test_streamed_steps_are_guarded_until_the_last_chunk(monkeypatch, stage, guard_name, start):
+    guard = UpstreamGuard(stage, max_concurrency=1, deadline=0.1, failure_threshold=1)
+    monkeypatch.setattr(main, guard_name, guard)
+
+    async def read_slowly():
+        monkeypatch.setattr(main, "client", fake_client(["Romance,", " 90s,", " Nostalgia"], 0.06))
+        started = time.perf_counter()
+        with pytest.raises(DeadlineExceeded):
+            async for _ in start():
+                # The slot stays taken while the stream is being read
+                assert guard.stats()["running"] == 1
+        return time.perf_counter() - started
+
+    assert run(read_slowly()) < 0.3
+    assert guard.counts["deadline"] == 1 and guard.breaker.state == "open"
+    assert guard.stats()["running"] == 0
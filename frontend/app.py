@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import os
 
+from backend_client import BackendClient
+
 # Page Config
 st.set_page_config(
     page_title="CineMatch AI", 
@@ -259,6 +261,18 @@ BACKEND_URL = os.getenv(
     "https://movie-recommendation-chatbot-production.up.railway.app/recommend"
 )
 
+# One pooled client (and result cache) per server process, shared by all sessions
+@st.cache_resource
+def get_backend():
+    return BackendClient(
+        BACKEND_URL,
+        cache_ttl=float(os.getenv("FRONTEND_CACHE_TTL", "600")),
+    )
+
+backend = get_backend()
+# Warm the cache so clicking a Quick Starter renders instantly
+backend.prefetch(STARTER_PROMPTS)
+
 # Initialize Chat History
 if "messages" not in st.session_state:
     st.session_state.messages = [
@@ -270,86 +284,73 @@ for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
-# Check if a starter prompt was triggered
-if "trigger_prompt" in st.session_state:
-    prompt = st.session_state.trigger_prompt
-    del st.session_state.trigger_prompt
-    
+def respond(prompt):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
     with st.chat_message("user"):
         st.markdown(prompt)
 
-    # Generate Response
+    # Generate Response, updating the bubble as each backend stage finishes
     with st.chat_message("assistant"):
-        with st.spinner("🎬 Analyzing your mood..."):
-            try:
-                response = requests.post(BACKEND_URL, json={"user_input": prompt}, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
+        status = st.empty()
+        mood = st.empty()
+        draft = st.empty()
+        status.markdown("🎬 Analyzing your mood...")
+        try:
+            streamed = ""
+            for event, data in backend.stream(prompt):
+                if event == "keywords":
+                    mood.markdown(f"Based on your vibe, I've analyzed the mood as: *{', '.join(data['llm_generated_keywords'])}*.")
+                    status.markdown("🔎 Searching our keyword library...")
+                elif event == "candidates":
+                    status.markdown(f"🎯 Found {len(data['candidates'])} candidates, picking the best matches...")
+                elif event == "token":
+                    streamed += data["text"]
+                    draft.markdown(streamed)
+                elif event == "error":
+                    status.empty()
+                    st.error(f"⚠️ Backend returned status code {data['status']}")
+                elif event == "result":
+                    status.empty()
+                    mood.empty()
+                    draft.empty()
                     rec_keywords = data.get("recommended_keywords", [])
                     llm_keywords = data.get("llm_generated_keywords", [])
-                    
-                    if rec_keywords:
-                        ai_message = f"Based on your vibe, I've analyzed the mood as: *{', '.join(llm_keywords)}*.\n\n"
-                        ai_message += "Here are the **best matching keywords** from our library for your search:\n\n"
-                        keyword_tags = " ".join([f"`{k}`" for k in rec_keywords])
-                        ai_message += f"{keyword_tags}\n\n"
-                        
-                        st.markdown(ai_message)
-                        st.session_state.messages.append({"role": "assistant", "content": ai_message})
-                    else:
-                        error_msg = "I understood your mood but couldn't find exact matches in our library. Could you try a different description?"
-                        st.warning(error_msg)
-                        st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                else:
-                    st.error(f"⚠️ Backend returned status code {response.status_code}")
-            except requests.exceptions.Timeout:
-                st.error("⏱️ Request timed out. The backend might be slow. Please try again.")
-            except requests.exceptions.ConnectionError:
-                st.error("🔌 Cannot connect to backend. Please check if the service is running.")
-            except Exception as e:
-                st.error(f"❌ An error occurred: {str(e)}")
 
-# User Input
-if prompt := st.chat_input("E.g., Chill Sunday morning, intense psychological thriller vibe..."):
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    # Generate Response
-    with st.chat_message("assistant"):
-        with st.spinner("🎬 Analyzing your mood..."):
-            try:
-                response = requests.post(BACKEND_URL, json={"user_input": prompt}, timeout=30)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    rec_keywords = data.get("recommended_keywords", [])
-                    llm_keywords = data.get("llm_generated_keywords", [])
-                    
                     if rec_keywords:
                         # Formatting the response
                         ai_message = f"Based on your vibe, I've analyzed the mood as: *{', '.join(llm_keywords)}*.\n\n"
                         ai_message += "Here are the **best matching keywords** from our library for your search:\n\n"
-                        
+
                         # Display keywords as badges/tags
                         keyword_tags = " ".join([f"`{k}`" for k in rec_keywords])
                         ai_message += f"{keyword_tags}\n\n"
-                        
+
                         st.markdown(ai_message)
                         st.session_state.messages.append({"role": "assistant", "content": ai_message})
                     else:
                         error_msg = "I understood your mood but couldn't find exact matches in our library. Could you try a different description?"
                         st.warning(error_msg)
                         st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                else:
-                    st.error(f"⚠️ Backend returned status code {response.status_code}")
-            except requests.exceptions.Timeout:
-                st.error("⏱️ Request timed out. The backend might be slow. Please try again.")
-            except requests.exceptions.ConnectionError:
-                st.error("🔌 Cannot connect to backend. Please check if the service is running.")
-            except Exception as e:
-                st.error(f"❌ An error occurred: {str(e)}")
+        except requests.exceptions.HTTPError as e:
+            status.empty()
+            st.error(f"⚠️ Backend returned status code {e.response.status_code}")
+        except requests.exceptions.Timeout:
+            status.empty()
+            st.error("⏱️ Request timed out. The backend might be slow. Please try again.")
+        except requests.exceptions.ConnectionError:
+            status.empty()
+            st.error("🔌 Cannot connect to backend. Please check if the service is running.")
+        except Exception as e:
+            status.empty()
+            st.error(f"❌ An error occurred: {str(e)}")
+
+# Check if a starter prompt was triggered
+if "trigger_prompt" in st.session_state:
+    prompt = st.session_state.trigger_prompt
+    del st.session_state.trigger_prompt
+    respond(prompt)
+
+# User Input
+if prompt := st.chat_input("E.g., Chill Sunday morning, intense psychological thriller vibe..."):
+    respond(prompt)
@@ -0,0 +1,119 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def cache_key(prompt):
+    # Same normalization as the backend's result cache
+    return re.sub(r"\s+", " ", prompt.strip().lower())
+
+
+class BackendClient:
+    """One keep-alive connection pool and result cache shared by every Streamlit session.
+
+    `stream()` answers repeated prompts from the cache, waits for a prefetch
+    that is already running, and only otherwise opens a new event stream.
+    `prefetch()` fills the cache in background threads.
+    """
+
+    def __init__(self, recommend_url, pool_size=10, cache_size=256, cache_ttl=600,
+                 timeout=(5, 30), prefetch_workers=4):
+        self.recommend_url = recommend_url
+        self.stream_url = recommend_url.rstrip("/") + "/stream"
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="prefetch")
+
+    def cached(self, prompt):
+        key = cache_key(prompt)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            stored_at, result = entry
+            if time.monotonic() - stored_at > self.cache_ttl:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return result
+
+    def _store(self, prompt, result):
+        # Like the backend, keep degraded answers out of the cache so recovery shows up at once
+        if result.get("degraded"):
+            return
+        with self._lock:
+            self._cache[cache_key(prompt)] = (time.monotonic(), result)
+            self._cache.move_to_end(cache_key(prompt))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def recommend(self, prompt):
+        """Blocking /recommend call; the result is cached."""
+        result = self.cached(prompt)
+        if result is not None:
+            return result
+        response = self.session.post(self.recommend_url, json={"user_input": prompt}, timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        self._store(prompt, result)
+        return result
+
+    def prefetch(self, prompts):
+        """Start background requests for prompts that are neither cached nor in flight."""
+        with self._lock:
+            for prompt in prompts:
+                key = cache_key(prompt)
+                if key in self._pending or key in self._cache:
+                    continue
+                future = self._executor.submit(self.recommend, prompt)
+                self._pending[key] = future
+                future.add_done_callback(lambda _, key=key: self._forget(key))
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def stream(self, prompt):
+        """Yield (event, data) pairs for `prompt`, from the cache when possible."""
+        with self._lock:
+            pending = self._pending.get(cache_key(prompt))
+        if pending is not None:
+            try:
+                pending.result(timeout=self.timeout[1])
+            except Exception:
+                pass  # fall back to a fresh stream below
+
+        result = self.cached(prompt)
+        if result is not None:
+            yield "keywords", {"llm_generated_keywords": result.get("llm_generated_keywords", [])}
+            yield "result", result
+            return
+
+        with self.session.post(self.stream_url, json={"user_input": prompt}, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            event = "message"
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[len("data:"):])
+                    if event == "result":
+                        self._store(prompt, data)
+                    yield event, data
+                    event = "message"